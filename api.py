@@ -0,0 +1,117 @@
+import datetime
+import hashlib
+import json
+
+import sqlalchemy as sa
+from flask import Blueprint, Response, abort, jsonify, request, stream_with_context
+from flask_login import current_user
+
+from data import db_session, queries
+from data.departments import Department
+from data.jobs import Jobs
+from data.news import News
+from data.users import User
+
+# Только чтение, JSON: /api/v1/jobs, /api/v1/news, /api/v1/departments, /api/v1/users
+#   ?fields=id,title   — в SELECT попадают только эти колонки (id — всегда)
+#   ?after=<id>&limit= — страница по ключу id, следующая — с after=next_after
+# ETag строится по max(modified_date) и count(*) видимых строк, поэтому повторный
+# запрос с If-None-Match к неизменившейся коллекции — один агрегатный запрос и 304.
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+# Поля, которые можно запросить; hashed_password, email и адреса наружу не отдаются
+RESOURCES = {
+    'jobs': (Jobs, ('id', 'job', 'team_leader', 'work_size', 'collaborators', 'start_date', 'end_date',
+                    'is_finished', 'modified_date')),
+    'news': (News, ('id', 'title', 'content', 'created_date', 'is_private', 'user_id', 'modified_date')),
+    'departments': (Department, ('id', 'title', 'chief', 'members', 'modified_date')),
+    'users': (User, ('id', 'surname', 'name', 'age', 'position', 'speciality', 'modified_date')),
+}
+
+
+@api.errorhandler(400)
+@api.errorhandler(404)
+def api_error(error):
+    return jsonify(error=error.description), error.code
+
+
+@api.route('/<resource>')
+def collection(resource):
+    if resource not in RESOURCES:
+        abort(404, f'Нет такого ресурса: {resource}')
+    model, allowed = RESOURCES[resource]
+    fields = _fields(allowed)
+    limit = min(max(request.args.get('limit', DEFAULT_LIMIT, type=int), 1), MAX_LIMIT)
+    after = request.args.get('after', type=int)
+
+    etag = _etag(model)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        query = _visible(model, sa.select(*(getattr(model, name) for name in fields)))
+        if after is not None:
+            query = query.where(model.id > after)
+        query = query.order_by(model.id).limit(limit + 1)
+        response = Response(stream_with_context(_items(query, fields, limit)),
+                            mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    response.cache_control.private = True
+    response.vary.add('Cookie')
+    return response
+
+
+def _fields(allowed):
+    names = [name.strip() for name in request.args.get('fields', '').split(',') if name.strip()]
+    unknown = set(names) - set(allowed)
+    if unknown:
+        abort(400, f'Неизвестные поля: {", ".join(sorted(unknown))}')
+    return ['id'] + [name for name in dict.fromkeys(names or allowed) if name != 'id']
+
+
+def _visible(model, query):
+    if model is News:
+        return queries.visible_news(query, current_user)
+    return query
+
+
+def _version_query(model):
+    if model is News:
+        return queries.news_version_query(current_user)
+    return sa.select(sa.func.max(model.modified_date), sa.func.count()).select_from(model)
+
+
+def _etag(model):
+    db_sess = db_session.create_session()
+    last, count = db_sess.execute(_version_query(model)).one()
+    # Тело ответа читается уже после teardown запроса, в своей транзакции (см. _items),
+    # поэтому соединение отпускаем сразу. Запись между ними даст лишь лишний 200 в следующий раз
+    db_sess.close()
+    # Видимость новостей зависит от пользователя, форма ответа — от параметров запроса
+    user = current_user.id if current_user.is_authenticated else None
+    return hashlib.sha1(f'{request.full_path}|{user}|{last}|{count}'.encode()).hexdigest()
+
+
+def _items(query, fields, limit):
+    # Строки читаются пачками и сразу пишутся в ответ; лишняя (limit + 1)-я
+    # только показывает, что есть следующая страница
+    db_sess = db_session.create_session()
+    yield '{"items": ['
+    last_id, next_after = None, None
+    for i, row in enumerate(db_sess.execute(query.execution_options(yield_per=queries.YIELD_PER))):
+        if i == limit:
+            next_after = last_id
+            continue
+        yield (',' if i else '') + json.dumps(dict(zip(fields, row)), ensure_ascii=False, default=_json_value)
+        last_id = row.id
+    yield f'], "next_after": {json.dumps(next_after)}}}'
+
+
+def _json_value(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} не сериализуется в JSON')
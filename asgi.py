@@ -0,0 +1,169 @@
+import io
+import os
+import sys
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import abort, render_template, request, session
+from flask_login import current_user
+
+import main
+from data import db_session, queries
+from data.page_cache import page_cache
+from data.user_directory import directory as user_directory
+
+
+# ASGI-вход: списки (/, /jobs, /departments) отдаются через AsyncSession
+# и не занимают поток, пока ждут базу. Остальные маршруты (формы, вход,
+# потоковые списки) уходят в обычное Flask-приложение через WsgiToAsgi.
+# Запуск: uvicorn asgi:app
+
+
+async def news_page(db_sess):
+    after = request.args.get('after')
+    if after:
+        try:
+            after = queries.parse_news_cursor(after)
+        except ValueError:
+            abort(400)
+    rows = await queries.fetch_async(db_sess, queries.news_feed_query(current_user, after, queries.PAGE_SIZE + 1))
+    news, last = queries.split_page(rows)
+    return render_template('common.html', news=news,
+                           next_after=queries.news_cursor(last) if last else None)
+
+
+async def jobs_page(db_sess):
+    query = queries.job_summaries_query(after=request.args.get('after', type=int))
+    jobs, last = queries.split_page(await queries.fetch_async(db_sess, query, scalars=False))
+    return render_template('jobs.html', jobs=jobs, next_after=last.id if last else None)
+
+
+async def departments_page(db_sess):
+    departs = await queries.fetch_async(db_sess, queries.departments_query(), limit=None)
+    return render_template('departments.html', departs=departs)
+
+
+PAGES = {
+    '/': (news_page, ('news', 'users')),
+    '/index': (news_page, ('news', 'users')),
+    '/jobs': (jobs_page, ('jobs', 'category', 'users')),
+    '/departments': (departments_page, ('departments', 'users')),
+}
+
+
+def make_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('127.0.0.1', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin1'),
+        'PATH_INFO': scope['path'].encode().decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f'HTTP/{scope["http_version"]}',
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        value = value.decode('latin1')
+        environ[name] = f'{environ[name]},{value}' if name in environ else value
+    return environ
+
+
+class AsyncApp:
+    def __init__(self, flask_app, db_file, profile=None):
+        self.flask_app = flask_app
+        self.db_file = db_file
+        self.profile = profile
+        self.wsgi = WsgiToAsgi(flask_app)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        page = PAGES.get(scope['path']) if scope['type'] == 'http' and scope['method'] == 'GET' else None
+        if page is None or 'stream' in parse_qs(scope['query_string'].decode('latin1')):
+            return await self.wsgi(scope, receive, send)
+        await self.render(page, scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.startup()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await db_session.dispose_async()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def startup(self):
+        db_session.global_init(self.db_file, self.profile, replicas=self.flask_app.config['DATABASE_REPLICAS'])
+        db_session.async_global_init(self.db_file, self.profile)
+
+    async def render(self, page, scope, receive, send):
+        handler, tables = page
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+
+        app = self.flask_app
+        environ = make_environ(scope, body)
+        ctx = app.request_context(environ)
+        error = None
+        ctx.push()
+        try:
+            try:
+                db_sess = db_session.create_async_session()
+                try:
+                    # Пользователь подгружается заранее, чтобы load_user взял его из кэша
+                    user_id = session.get('_user_id')
+                    if user_id is not None:
+                        await user_directory.get_async(user_id, db_sess)
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        rv = await self.dispatch(handler, tables, db_sess)
+                finally:
+                    # Не через async with: __aexit__ закрывает сессию в отдельной задаче,
+                    # и счётчики db_session.stats() этого запроса не обнулились бы
+                    await db_sess.close()
+            except Exception as e:
+                rv = app.handle_user_exception(e)
+            response = app.finalize_request(rv)
+        except Exception as e:
+            error = e
+            response = app.make_response(app.handle_exception(e))
+        finally:
+            ctx.pop(error)
+
+        # get_app_iter сам убирает тело у 304 и HEAD
+        headers = response.get_wsgi_headers(environ)
+        body = b''.join(response.get_app_iter(environ))
+        response.close()
+        await send({'type': 'http.response.start',
+                    'status': response.status_code,
+                    'headers': [(k.lower().encode('latin1'), v.encode('latin1')) for k, v in headers.items()]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def dispatch(self, handler, tables, db_sess):
+        if not page_cache.applies():
+            return await handler(db_sess)
+        key, versions, entry = page_cache.lookup(tables)
+        if entry is None:
+            entry = page_cache.store(key, await handler(db_sess))
+        return page_cache.respond(entry, versions)
+
+
+app = AsyncApp(main.app, os.environ.get('DATABASE_URL', 'db/blogs.db'))
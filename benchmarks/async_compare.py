@@ -0,0 +1,115 @@
+import argparse
+import asyncio
+import concurrent.futures
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import generate
+from benchmarks.run import _percentile
+from data import db_session
+
+# Сравнение синхронного Flask (потоки + test_client) и ASGI-входа asgi.py
+# (одна петля asyncio, прямые ASGI-вызовы) под одинаковой параллельной нагрузкой:
+#   python -m benchmarks.async_compare --scale medium --concurrency 1 8 32
+# Страничный кэш выключен, чтобы мерить именно работу с базой.
+
+PATHS = ('/', '/jobs', '/departments')
+
+
+def _summary(timings, elapsed):
+    return {'requests': len(timings),
+            'rps': round(len(timings) / elapsed, 1),
+            'p50_ms': round(_percentile(timings, 0.5), 2),
+            'p95_ms': round(_percentile(timings, 0.95), 2)}
+
+
+def run_sync(app, requests, concurrency):
+    def worker(count):
+        client = app.test_client()
+        timings = []
+        for i in range(count):
+            started = time.perf_counter()
+            response = client.get(PATHS[i % len(PATHS)])
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise SystemExit(f'sync: неожиданный ответ {response.status_code}')
+        return timings
+
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as pool:
+        parts = pool.map(worker, [requests // concurrency] * concurrency)
+        timings = [t for part in parts for t in part]
+    return _summary(timings, time.perf_counter() - started)
+
+
+async def _asgi_get(app, path):
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'', 'headers': [],
+             'http_version': '1.1', 'scheme': 'http', 'server': ('localhost', 80),
+             'client': ('127.0.0.1', 0), 'root_path': ''}
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return messages[0]['status']
+
+
+async def run_async(app, requests, concurrency):
+    async def worker(count):
+        timings = []
+        for i in range(count):
+            started = time.perf_counter()
+            status = await _asgi_get(app, PATHS[i % len(PATHS)])
+            timings.append((time.perf_counter() - started) * 1000)
+            if status != 200:
+                raise SystemExit(f'async: неожиданный ответ {status}')
+        return timings
+
+    started = time.perf_counter()
+    parts = await asyncio.gather(*(worker(requests // concurrency) for _ in range(concurrency)))
+    timings = [t for part in parts for t in part]
+    result = _summary(timings, time.perf_counter() - started)
+    # Соединения aiosqlite привязаны к петле, а каждый прогон идёт в новой
+    await db_session.get_async_engine().dispose()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.async_compare')
+    parser.add_argument('--db', help='готовая база из benchmarks.generate (иначе создаётся временная)')
+    parser.add_argument('--scale', choices=generate.SCALES, default='small')
+    parser.add_argument('--requests', type=int, default=300, help='запросов на один прогон')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = args.db
+        if db_file is None:
+            db_file = os.path.join(tmp, 'bench.db')
+            generate.generate(db_file, **generate.SCALES[args.scale])
+
+        import main as web
+        import asgi
+        web.page_cache.configure('off')
+        asgi_app = asgi.AsyncApp(web.app, db_file)
+        asgi_app.startup()
+
+        print(f'{"режим":<6} {"потоки":>6} {"req/s":>8} {"p50, мс":>8} {"p95, мс":>8}')
+        for concurrency in args.concurrency:
+            for mode, result in (('sync', run_sync(web.app, args.requests, concurrency)),
+                                 ('async', asyncio.run(run_async(asgi_app, args.requests, concurrency)))):
+                print(f'{mode:<6} {concurrency:>6} {result["rps"]:>8} '
+                      f'{result["p50_ms"]:>8} {result["p95_ms"]:>8}')
+        db_session.get_engine().dispose()
+
+
+if __name__ == '__main__':
+    main()
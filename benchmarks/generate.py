@@ -0,0 +1,112 @@
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash
+
+from data import db_session, migrations
+from data.category import Category, LEVELS, association_table
+from data.departments import Department, department_members
+from data.jobs import Jobs, job_collaborators
+from data.news import News
+from data.users import User
+
+# Синтетическая база заданного размера на моделях из data/:
+#   python -m benchmarks.generate /tmp/bench.db --scale medium
+# Пользователь 1 — администратор admin@mars.org, у всех пароль "password".
+
+SCALES = {
+    'small': {'users': 100, 'jobs': 500, 'news': 2000, 'departments': 20},
+    'medium': {'users': 1000, 'jobs': 10000, 'news': 50000, 'departments': 200},
+    'large': {'users': 10000, 'jobs': 100000, 'news': 500000, 'departments': 2000},
+}
+PASSWORD = 'password'
+ADMIN_EMAIL = 'admin@mars.org'
+BATCH_SIZE = 5000
+
+
+def _insert(conn, table, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            conn.execute(table.insert(), batch)
+            batch = []
+    if batch:
+        conn.execute(table.insert(), batch)
+
+
+def generate(db_file, users, jobs, news, departments, seed=1, password_method='pbkdf2:sha256:1000'):
+    rnd = random.Random(seed)
+    engine = db_session.create_engine(db_file)
+    migrations.upgrade(engine)
+    hashed = generate_password_hash(PASSWORD, password_method)
+    start = datetime.datetime(2023, 1, 1)
+
+    def sample_users(k):
+        return rnd.sample(range(1, users + 1), min(k, users))
+
+    with engine.begin() as conn:
+        _insert(conn, User.__table__, (
+            {'id': i, 'surname': f'Surname{i}', 'name': f'Name{i}', 'age': rnd.randint(20, 60),
+             'position': 'colonist', 'speciality': 'engineer', 'address': f'module_{i % 10}',
+             'email': ADMIN_EMAIL if i == 1 else f'user{i}@mars.org', 'hashed_password': hashed,
+             'modified_date': start}
+            for i in range(1, users + 1)))
+        _insert(conn, Category.__table__, ({'id': level + 1, 'level': level} for level in LEVELS))
+
+        job_collabs = {i: sample_users(rnd.randint(0, 4)) for i in range(1, jobs + 1)}
+        _insert(conn, Jobs.__table__, (
+            {'id': i, 'team_leader': rnd.randint(1, users), 'job': f'Job {i}',
+             'work_size': rnd.randint(1, 100), 'collaborators': ','.join(map(str, sorted(job_collabs[i]))),
+             'start_date': start + datetime.timedelta(hours=i),
+             'end_date': start + datetime.timedelta(hours=i + rnd.randint(1, 500)),
+             'is_finished': rnd.random() < 0.5}
+            for i in range(1, jobs + 1)))
+        _insert(conn, job_collaborators, ({'job_id': i, 'user_id': u}
+                                          for i, ids in job_collabs.items() for u in ids))
+        _insert(conn, association_table, ({'jobs': i, 'category': level + 1}
+                                          for i in range(1, jobs + 1)
+                                          for level in rnd.sample(LEVELS, rnd.randint(0, 3))))
+
+        _insert(conn, News.__table__, (
+            {'id': i, 'title': f'News {i}', 'content': 'Lorem ipsum dolor sit amet ' * rnd.randint(1, 20),
+             'created_date': start + datetime.timedelta(minutes=i), 'is_private': rnd.random() < 0.3,
+             'user_id': rnd.randint(1, users)}
+            for i in range(1, news + 1)))
+
+        dep_members = {i: sample_users(rnd.randint(1, 10)) for i in range(1, departments + 1)}
+        _insert(conn, Department.__table__, (
+            {'id': i, 'title': f'Department {i}', 'chief': rnd.randint(1, users),
+             'members': ','.join(map(str, sorted(dep_members[i]))), 'email': f'dep{i}@mars.org'}
+            for i in range(1, departments + 1)))
+        _insert(conn, department_members, ({'department_id': i, 'user_id': u}
+                                           for i, ids in dep_members.items() for u in ids))
+    engine.dispose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.generate')
+    parser.add_argument('db_file')
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    for name in ('users', 'jobs', 'news', 'departments'):
+        parser.add_argument(f'--{name}', type=int, help='переопределяет значение из --scale')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.db_file):
+        raise SystemExit(f'{args.db_file} уже существует')
+    sizes = dict(SCALES[args.scale])
+    sizes.update((name, getattr(args, name)) for name in sizes if getattr(args, name) is not None)
+    started = time.perf_counter()
+    generate(args.db_file, seed=args.seed, **sizes)
+    print(f'{args.db_file}: {sizes} за {time.perf_counter() - started:.1f} с')
+
+
+if __name__ == '__main__':
+    main()
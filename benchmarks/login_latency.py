@@ -0,0 +1,65 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data import db_session, passwords
+from data.users import User
+
+# Задержка POST /login при разной стоимости хеша:
+#   python -m benchmarks.login_latency --requests 20
+
+METHODS = ('pbkdf2:sha256:100000', 'pbkdf2:sha256:600000', 'scrypt:16384:8:1', 'scrypt:32768:8:1')
+
+
+def measure(client, method, requests):
+    passwords.configure(method=method)
+    db_sess = db_session.create_session()
+    user = db_sess.query(User).filter(User.email == 'bench@mars.org').first()
+    user.set_password('secret')
+    db_sess.commit()
+    db_session.remove_session()
+
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.post('/login', data={'email': 'bench@mars.org', 'password': 'secret'})
+        timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 302, response.status_code
+        client.get('/logout')
+    timings.sort()
+    return {'method': method,
+            'mean_ms': statistics.mean(timings),
+            'p50_ms': timings[len(timings) // 2],
+            'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.login_latency')
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--method', action='append', help='можно указать несколько раз')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_session.global_init(os.path.join(tmp, 'bench.db'))
+        db_sess = db_session.create_session()
+        db_sess.add(User(email='bench@mars.org', name='Bench', surname='Mark'))
+        db_sess.commit()
+        db_session.remove_session()
+
+        import main as web
+        web.app.config['WTF_CSRF_ENABLED'] = False
+        client = web.app.test_client()
+        print(f"{'method':<24}{'mean, ms':>10}{'p50, ms':>10}{'p95, ms':>10}")
+        for method in args.method or METHODS:
+            result = measure(client, method, args.requests)
+            print(f"{result['method']:<24}{result['mean_ms']:>10.1f}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}")
+        db_session.get_engine().dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+import argparse
+import datetime
+import os
+import re
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlalchemy as sa
+
+from benchmarks import generate
+from data import db_session, migrations, queries
+from data.db_session import SqlAlchemyBase
+from data.departments import Department
+from data.jobs import Jobs
+from data.news import News
+
+# Проверка планов запросов ленты, ETag новостей и проверок владельца: ни один из них не должен
+# читать таблицу или индекс целиком (строка "SCAN <таблица>" в EXPLAIN QUERY PLAN).
+# Исключение — просмотр частичного индекса: в нём только подходящие строки,
+# и в ленте LIMIT останавливает его на первой странице.
+#   python -m benchmarks.query_plans            — на временной базе --scale small
+#   python -m benchmarks.query_plans --db /tmp/bench.db
+# Код выхода 1, если найден полный просмотр.
+
+SCAN = re.compile(r'\bSCAN (news|jobs|departments|users)\b(?: USING (?:COVERING )?INDEX (\w+))?')
+
+
+class _User:
+    is_authenticated = True
+
+    def __init__(self, user_id):
+        self.id = user_id
+
+
+def checked_queries():
+    user, admin = _User(2), _User(1)
+    after = (datetime.datetime(2023, 1, 2), 100)
+    return {
+        'лента, гость': queries.news_feed_query(None, None, queries.PAGE_SIZE + 1),
+        'лента, гость, дальше': queries.news_feed_query(None, after, queries.PAGE_SIZE + 1),
+        'лента, пользователь': queries.news_feed_query(user, None, queries.PAGE_SIZE + 1),
+        'лента, пользователь, дальше': queries.news_feed_query(user, after, queries.PAGE_SIZE + 1),
+        'edit_news / news_delete': sa.select(News).where(News.id == 5, queries.owned_by(News.user_id, user)),
+        'edit_news, администратор': sa.select(News).where(News.id == 5, queries.owned_by(News.user_id, admin)),
+        'edit_jobs / job_delete': sa.select(Jobs).where(Jobs.id == 5, queries.owned_by(Jobs.team_leader, user)),
+        'edit_depart / depart_delete': sa.select(Department).where(
+            Department.id == 5, queries.owned_by(Department.chief, user)),
+        'работы тимлида': sa.select(Jobs.id).where(Jobs.team_leader == user.id),
+        'департаменты руководителя': sa.select(Department.id).where(Department.chief == user.id),
+        'записи автора': sa.select(News.id).where(News.user_id == user.id),
+        'работы участника': queries.jobs_of_user_query(user.id),
+        'департаменты участника': queries.departments_of_user_query(user.id),
+        'ETag новостей, гость': queries.news_version_query(None),
+        'ETag новостей, пользователь': queries.news_version_query(user),
+    }
+
+
+def partial_indexes():
+    return {index.name for table in SqlAlchemyBase.metadata.tables.values() for index in table.indexes
+            if index.dialect_options['sqlite']['where'] is not None}
+
+
+def full_scans(plan):
+    allowed = partial_indexes()
+    return [line for line in plan
+            if (match := SCAN.search(line)) and match.group(2) not in allowed]
+
+
+def explain(conn, query):
+    sql = query.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True})
+    return [row[-1] for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.query_plans')
+    parser.add_argument('--db', help='база SQLite (иначе временная из benchmarks.generate)')
+    parser.add_argument('--scale', choices=generate.SCALES, default='small')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = args.db
+        if db_file is None:
+            db_file = os.path.join(tmp, 'plans.db')
+            generate.generate(db_file, **generate.SCALES[args.scale])
+        engine = db_session.create_engine(db_file)
+        migrations.ensure(engine)
+
+        failed = []
+        with engine.connect() as conn:
+            for name, query in checked_queries().items():
+                plan = explain(conn, query)
+                scans = full_scans(plan)
+                print(f'{"ПОЛНЫЙ ПРОСМОТР" if scans else "ok":<16} {name}')
+                for line in plan:
+                    print(f'{"":<16}   {line}')
+                if scans:
+                    failed.append(name)
+        engine.dispose()
+
+    if failed:
+        raise SystemExit(f'Полный просмотр таблицы: {", ".join(failed)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlalchemy as sa
+
+from benchmarks import generate
+
+# Нагрузочный прогон приложения внутри процесса через app.test_client():
+#   python -m benchmarks.run --scale small --output results.json
+#   python -m benchmarks.run --db /tmp/bench.db --compare results.json
+# Для каждого сценария считаются p50/p95/p99, запросы к БД на HTTP-запрос
+# (по заголовку X-SQL-Queries) и пиковая память процесса (ru_maxrss).
+# С --trace-memory добавляется пик выделений Python по tracemalloc, но он
+# заметно замедляет запросы, поэтому по умолчанию выключен.
+
+
+def _percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(share * (len(values) - 1))))]
+
+
+class Runner:
+    def __init__(self, app, db_sess_factory, requests, seed=1, trace_memory=False):
+        self.client = app.test_client()
+        self.trace_memory = trace_memory
+        self.create_session = db_sess_factory
+        self.requests = requests
+        self.rnd = random.Random(seed)
+        self.results = {}
+
+    def max_id(self, model):
+        db_sess = self.create_session()
+        return db_sess.scalar(sa.select(sa.func.max(model.id))) or 0
+
+    def scenario(self, name, make_request, expected=(200, 302)):
+        timings, queries = [], []
+        if self.trace_memory:
+            tracemalloc.start()
+        for i in range(self.requests):
+            started = time.perf_counter()
+            response = make_request(i)
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code not in expected:
+                raise SystemExit(f'{name}: неожиданный ответ {response.status_code}')
+            queries.append(int(response.headers.get('X-SQL-Queries', 0)))
+        traced_peak = None
+        if self.trace_memory:
+            traced_peak = tracemalloc.get_traced_memory()[1] / 1024
+            tracemalloc.stop()
+        self.results[name] = {
+            'requests': len(timings),
+            'mean_ms': sum(timings) / len(timings),
+            'p50_ms': _percentile(timings, 0.50),
+            'p95_ms': _percentile(timings, 0.95),
+            'p99_ms': _percentile(timings, 0.99),
+            'queries_per_request': sum(queries) / len(queries),
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'traced_peak_kb': traced_peak,
+        }
+        print(f"{name:<24}{self.results[name]['p50_ms']:>9.2f}{self.results[name]['p95_ms']:>9.2f}"
+              f"{self.results[name]['p99_ms']:>9.2f}{self.results[name]['queries_per_request']:>9.1f}"
+              f"{self.results[name]['peak_rss_kb']:>11}")
+
+
+def run(app, requests, seed=1, trace_memory=False):
+    from data import db_session
+    from data.departments import Department
+    from data.jobs import Jobs
+    from data.news import News
+
+    runner = Runner(app, db_session.create_session, requests, seed, trace_memory)
+    client, rnd = runner.client, runner.rnd
+    job_form = {'name': 'Bench job', 'w_size': 10, 'collab': ['1', '2'], 'hazard_level': ['1', '2'],
+                'start_date': '2023-02-25 12:00:00', 'end_date': '2023-02-26 12:00:00'}
+    news_form = {'title': 'Bench news', 'content': 'content'}
+    depart_form = {'title': 'Bench department', 'email': generate.ADMIN_EMAIL,
+                   'email_dep': 'bench@mars.org', 'members': ['1', '2']}
+
+    print(f"{'scenario':<24}{'p50, ms':>9}{'p95, ms':>9}{'p99, ms':>9}{'queries':>9}{'rss, KiB':>11}")
+    runner.scenario('GET / (anonymous)', lambda i: client.get('/'))
+    runner.scenario('GET /jobs (anonymous)', lambda i: client.get('/jobs'))
+    runner.scenario('GET /departments (anon)', lambda i: client.get('/departments'))
+    runner.scenario('POST /login', lambda i: client.post('/login', data={
+        'email': generate.ADMIN_EMAIL, 'password': generate.PASSWORD}))
+
+    runner.scenario('GET /', lambda i: client.get('/'))
+    runner.scenario('GET /jobs', lambda i: client.get('/jobs'))
+    runner.scenario('GET /departments', lambda i: client.get('/departments'))
+
+    first_job = runner.max_id(Jobs) + 1
+    runner.scenario('POST /addjob', lambda i: client.post('/addjob', data=job_form))
+    runner.scenario('GET /addjob/<id>', lambda i: client.get(f'/addjob/{first_job + i}'))
+    runner.scenario('POST /addjob/<id>', lambda i: client.post(f'/addjob/{first_job + i}', data=dict(
+        job_form, hazard_level=[str(rnd.randint(0, 10))])))
+    runner.scenario('GET /job_delete/<id>', lambda i: client.get(f'/job_delete/{first_job + i}'))
+
+    first_news = runner.max_id(News) + 1
+    runner.scenario('POST /news', lambda i: client.post('/news', data=news_form))
+    runner.scenario('POST /news/<id>', lambda i: client.post(f'/news/{first_news + i}', data=news_form))
+    runner.scenario('GET /news_delete/<id>', lambda i: client.get(f'/news_delete/{first_news + i}'))
+
+    first_depart = runner.max_id(Department) + 1
+    runner.scenario('POST /add_department', lambda i: client.post('/add_department', data=depart_form))
+    runner.scenario('POST /departments/<id>', lambda i: client.post(f'/departments/{first_depart + i}',
+                                                                    data=depart_form))
+    runner.scenario('GET /depart_delete/<id>', lambda i: client.get(f'/depart_delete/{first_depart + i}'))
+    client.get('/logout')
+    return runner.results
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+            regressions.append(f"{name}: p95 {previous['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms")
+        if current['queries_per_request'] > previous['queries_per_request']:
+            regressions.append(f"{name}: запросов к БД {previous['queries_per_request']:.1f} -> "
+                               f"{current['queries_per_request']:.1f}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run')
+    parser.add_argument('--db', help='готовая база из benchmarks.generate (иначе создаётся временная)')
+    parser.add_argument('--scale', choices=generate.SCALES, default='small')
+    parser.add_argument('--requests', type=int, default=50, help='запросов на сценарий')
+    parser.add_argument('--page-cache', default='off', help='значение PAGE_CACHE на время прогона')
+    parser.add_argument('--trace-memory', action='store_true')
+    parser.add_argument('--output', help='сохранить результаты в JSON')
+    parser.add_argument('--compare', help='JSON прошлого прогона для поиска регрессий')
+    parser.add_argument('--threshold', type=float, default=0.2, help='допустимый рост p95 (доля)')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = args.db
+        if db_file is None:
+            db_file = os.path.join(tmp, 'bench.db')
+            generate.generate(db_file, **generate.SCALES[args.scale])
+
+        from data import db_session, instrumentation, passwords
+        import main as web
+        db_session.global_init(db_file)
+        passwords.configure(method='pbkdf2:sha256:1000')
+        web.page_cache.configure(args.page_cache)
+        web.app.config['WTF_CSRF_ENABLED'] = False
+        if not web.app.config['INSTRUMENTATION']:
+            instrumentation.init_app(web.app)
+
+        results = run(web.app, args.requests, trace_memory=args.trace_memory)
+        db_session.get_engine().dispose()
+
+    report = {
+        'meta': {'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+                 'db': args.db, 'scale': None if args.db else args.scale,
+                 'requests': args.requests, 'page_cache': args.page_cache,
+                 'python': platform.python_version(), 'sqlalchemy': sa.__version__},
+        'scenarios': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for line in regressions:
+            print(f'РЕГРЕССИЯ {line}')
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import argparse
+import datetime
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlalchemy as sa
+from sqlalchemy import orm
+
+from data import db_session, migrations, queries, search
+from data.news import News
+from data.users import User
+
+# Поиск по FTS5 (data/search.py) против LIKE '%слово%' по news:
+#   python -m benchmarks.search_vs_like --rows 1000000
+# Словарь синтетический, частоты слов по закону Ципфа, поэтому есть
+# и частые слова (много совпадений), и редкие. LIKE ищет подстроку,
+# FTS — слова и их начала, так что число совпадений может немного отличаться.
+
+BATCH_SIZE = 10000
+VOCABULARY = 20000
+WORDS_PER_NEWS = 25
+
+
+def _words(rnd):
+    syllables = ['ма', 'рс', 'ко', 'ло', 'ни', 'я', 'ра', 'кет', 'а', 'до', 'ст', 'ав', 'ка', 'ис', 'сле']
+    words = set()
+    while len(words) < VOCABULARY:
+        words.add(''.join(rnd.choice(syllables) for _ in range(rnd.randint(2, 4))))
+    return sorted(words)
+
+
+def populate(engine, rows, seed=1):
+    rnd = random.Random(seed)
+    words = _words(rnd)
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+    start = datetime.datetime(2023, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{'id': 1, 'name': 'Bench', 'surname': 'Bench',
+                                                'email': 'bench@mars.org', 'hashed_password': '-'}])
+        for offset in range(0, rows, BATCH_SIZE):
+            conn.execute(News.__table__.insert(), [
+                {'id': i + 1,
+                 'title': ' '.join(rnd.choices(words, cum_weights=weights, k=4)),
+                 'content': ' '.join(rnd.choices(words, cum_weights=weights, k=WORDS_PER_NEWS)),
+                 'created_date': start + datetime.timedelta(minutes=i),
+                 'is_private': i % 10 == 0, 'user_id': 1}
+                for i in range(offset, min(rows, offset + BATCH_SIZE))])
+    return words
+
+
+def like_query(word):
+    pattern = f'%{word}%'
+    query = sa.select(News).where(News.title.like(pattern) | News.content.like(pattern))
+    return queries.visible_news(query).order_by(News.created_date.desc()).limit(queries.PAGE_SIZE + 1)
+
+
+def measure(func, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.search_vs_like')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--db', help='куда сохранить базу (иначе временный файл)')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = args.db or os.path.join(tmp, 'search.db')
+        engine = db_session.create_engine(db_file)
+        migrations.upgrade(engine)
+        started = time.perf_counter()
+        words = populate(engine, args.rows)
+        print(f'{args.rows} записей с индексом FTS за {time.perf_counter() - started:.1f} с')
+
+        db_sess = orm.Session(engine)
+        print(f'{"слово":<16} {"частота":>8} {"FTS, мс":>10} {"LIKE, мс":>10} {"FTS count, мс":>14} {"LIKE count, мс":>15}')
+        for rank in (0, 100, 5000, VOCABULARY - 1):
+            word = words[rank]
+            fts = measure(lambda: search.search_news(db_sess, None, word), args.repeats)
+            like = measure(lambda: db_sess.scalars(like_query(word)).all(), args.repeats)
+            fts_count = measure(lambda: db_sess.scalar(
+                sa.text('SELECT count(*) FROM news_fts WHERE news_fts MATCH :q'),
+                {'q': search.match_query(word)}), args.repeats)
+            like_count = measure(lambda: db_sess.scalar(
+                sa.select(sa.func.count()).select_from(like_query(word).limit(None).subquery())), args.repeats)
+            print(f'{word:<16} {"#" + str(rank + 1):>8} {fts:>10.2f} {like:>10.2f} '
+                  f'{fts_count:>14.2f} {like_count:>15.2f}')
+        db_sess.close()
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+import argparse
+import csv
+import datetime
+import itertools
+import json
+import sys
+import time
+
+import sqlalchemy as sa
+
+from . import db_session, migrations, __all_models
+from .db_session import SqlAlchemyBase
+
+# Массовая загрузка и выгрузка таблиц в CSV/JSONL через Core insert()/select()
+# без создания ORM-объектов на каждую строку.
+#
+#   python -m data.bulk import users users.csv --db db/blogs.db --batch-size 5000 --defer-indexes
+#   python -m data.bulk export jobs jobs.jsonl --db db/blogs.db
+# CSV не отличает NULL от пустой строки: пустая ячейка текстовой колонки загружается
+# как '', числа или даты — как NULL. Для точной копии таблицы — JSONL.
+
+TABLES = ('users', 'jobs', 'news', 'departments', 'category', 'association',
+          'job_collaborators', 'department_members')
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y', 't')
+
+
+def _parse_datetime(value):
+    if isinstance(value, datetime.datetime):
+        return value
+    return datetime.datetime.fromisoformat(value)
+
+
+def _converter(column):
+    if isinstance(column.type, sa.Boolean):
+        return _parse_bool
+    if isinstance(column.type, sa.DateTime):
+        return _parse_datetime
+    if isinstance(column.type, sa.Integer):
+        return int
+    return None
+
+
+def _prepare(table, rows):
+    converters = {column.name: _converter(column) for column in table.columns}
+    for number, row in enumerate(rows, 1):
+        unknown = row.keys() - converters.keys()
+        if unknown:
+            raise SystemExit(f"В таблице {table.name} нет колонок: {', '.join(sorted(unknown))}")
+        prepared = {}
+        for name, value in row.items():
+            converter = converters[name]
+            # Пустая ячейка CSV у числа или даты — NULL, у строки — пустая строка
+            if value is None or (value == '' and converter is not None):
+                value = None
+            elif converter is not None:
+                try:
+                    value = converter(value)
+                except (TypeError, ValueError) as e:
+                    raise SystemExit(f'{table.name}, запись {number}, колонка {name}: '
+                                     f'не удалось разобрать {value!r} ({e})')
+            prepared[name] = value
+        yield prepared
+
+
+def _read(path, fmt):
+    with open(path, encoding='utf-8', newline='') as file:
+        if fmt == 'csv':
+            yield from csv.DictReader(file)
+        else:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def import_rows(engine, table, rows, batch_size=5000, defer_indexes=False):
+    # Уникальные индексы остаются: без них дубликаты загрузились бы, а индекс потом не построился
+    indexes = [index for index in table.indexes if not index.unique] if defer_indexes else []
+    for index in indexes:
+        index.drop(engine, checkfirst=True)
+    count = 0
+    try:
+        for batch in _batches(_prepare(table, rows), batch_size):
+            with engine.begin() as conn:
+                for group in _same_keys(batch):
+                    conn.execute(table.insert(), group)
+            count += len(batch)
+    finally:
+        for index in indexes:
+            index.create(engine, checkfirst=True)
+    return count
+
+
+def _same_keys(batch):
+    # executemany берёт набор колонок из первой строки, поэтому строки JSONL с другими
+    # ключами вставляются отдельно; пропущенные колонки получают значения по умолчанию
+    groups = {}
+    for row in batch:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    return groups.values()
+
+
+def export_rows(engine, table, batch_size=5000):
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(sa.select(table))
+        for row in result.mappings():
+            yield dict(row)
+
+
+def _serialize(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+def _write(path, fmt, table, rows):
+    count = 0
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        if fmt == 'csv':
+            writer = csv.DictWriter(file, fieldnames=[column.name for column in table.columns])
+            writer.writeheader()
+        for row in rows:
+            row = {name: _serialize(value) for name, value in row.items()}
+            if fmt == 'csv':
+                writer.writerow(row)
+            else:
+                file.write(json.dumps(row, ensure_ascii=False) + '\n')
+            count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m data.bulk',
+                                     description='Массовый импорт и экспорт таблиц')
+    parser.add_argument('command', choices=('import', 'export'))
+    parser.add_argument('table', choices=TABLES)
+    parser.add_argument('file')
+    parser.add_argument('--db', default='db/blogs.db', help='путь к SQLite или URL SQLAlchemy')
+    parser.add_argument('--format', choices=('csv', 'jsonl'),
+                        help='по умолчанию определяется по расширению файла')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--defer-indexes', action='store_true',
+                        help='удалить неуникальные индексы таблицы на время загрузки и построить заново в конце')
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ('jsonl' if args.file.endswith(('.jsonl', '.json')) else 'csv')
+    engine = db_session.create_engine(args.db)
+    migrations.upgrade(engine)
+    table = SqlAlchemyBase.metadata.tables[args.table]
+
+    started = time.perf_counter()
+    if args.command == 'import':
+        count = import_rows(engine, table, _read(args.file, fmt),
+                            batch_size=args.batch_size, defer_indexes=args.defer_indexes)
+    else:
+        count = _write(args.file, fmt, table, export_rows(engine, table, args.batch_size))
+    elapsed = time.perf_counter() - started
+    print(f'{args.command} {args.table}: {count} строк за {elapsed:.2f} с '
+          f'({count / elapsed if elapsed else 0:.0f} строк/с)', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
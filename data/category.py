@@ -1,5 +1,8 @@
+import threading
+
 import sqlalchemy
-from sqlalchemy.orm import relationship
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, relationship
 from .db_session import SqlAlchemyBase
 
 
@@ -9,7 +12,8 @@ association_table = sqlalchemy.Table(
     sqlalchemy.Column('jobs', sqlalchemy.Integer,
                       sqlalchemy.ForeignKey('jobs.id')),
     sqlalchemy.Column('category', sqlalchemy.Integer,
-                      sqlalchemy.ForeignKey('category.id'))
+                      sqlalchemy.ForeignKey('category.id')),
+    sqlalchemy.Index('ix_association_jobs_category', 'jobs', 'category', unique=True)
 )
 
 
@@ -17,4 +21,65 @@ class Category(SqlAlchemyBase):
     __tablename__ = 'category'
     id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True,
                            autoincrement=True)
-    level = sqlalchemy.Column(sqlalchemy.Integer, nullable=True)
+    level = sqlalchemy.Column(sqlalchemy.Integer, nullable=True, unique=True, index=True)
+
+
+LEVELS = tuple(range(11))
+
+# level -> id; уровней всего 11, поэтому держим их в памяти процесса.
+# Уровень, созданный в транзакции, попадает сюда только после её commit:
+# после rollback в кэше остался бы id строки, которой нет
+_category_ids = {}
+_lock = threading.Lock()
+_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def category_ids(db_sess, levels):
+    levels = sorted(set(levels))
+    ids = {level: _category_ids[level] for level in levels if level in _category_ids}
+    missing = [level for level in levels if level not in ids]
+    if missing:
+        ids.update(_load_ids(db_sess, missing))
+    return ids
+
+
+def forget_categories():
+    with _lock:
+        _category_ids.clear()
+
+
+def _load_ids(db_sess, levels):
+    # Если в старой базе остались дубликаты, берём строку с наименьшим id
+    query = (sqlalchemy.select(Category.level, sqlalchemy.func.min(Category.id))
+             .where(Category.level.in_(levels))
+             .group_by(Category.level))
+    created = db_sess.info.setdefault('created_category_ids', {})
+    found = dict(db_sess.execute(query).all())
+    with _lock:
+        _category_ids.update((level, category_id) for level, category_id in found.items()
+                             if level not in created)
+    missing = [level for level in levels if level not in found]
+    if missing:
+        # Тот же уровень может одновременно добавлять другой воркер: повтор
+        # пропускается (уникальный индекс по level), id перечитываются
+        insert = _INSERTS[db_sess.get_bind().dialect.name](Category.__table__)
+        db_sess.execute(insert.values([{'level': level} for level in missing])
+                        .on_conflict_do_nothing(index_elements=['level']))
+        new_ids = dict(db_sess.execute(query.where(Category.level.in_(missing))).all())
+        created.update(new_ids)
+        found.update(new_ids)
+    return found
+
+
+@sqlalchemy.event.listens_for(Session, 'after_commit')
+def _remember_created(session):
+    created = session.info.pop('created_category_ids', None)
+    if created:
+        with _lock:
+            _category_ids.update(created)
+
+
+@sqlalchemy.event.listens_for(Session, 'after_transaction_end')
+def _drop_created(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('created_category_ids', None)
@@ -1,3 +1,10 @@
+import contextlib
+import contextvars
+import os
+import random
+import sqlite3
+import threading
+
 import sqlalchemy as sa
 import sqlalchemy.orm as orm
 from sqlalchemy.orm import Session
@@ -5,29 +12,312 @@ import sqlalchemy.ext.declarative as dec
 
 SqlAlchemyBase = dec.declarative_base()
 
+__config = None
+__async_config = None
 __factory = None
+__async_factory = None
+__init_lock = threading.Lock()
+# Счётчики открытых сессий и соединений. ContextVar, а не threading.local:
+# в asgi.py запросы чередуются в одном потоке, и у каждого свой контекст.
+__counters = {'sessions': contextvars.ContextVar('sessions', default=0),
+              'connections': contextvars.ContextVar('connections', default=0)}
+# Чтение с основной базы вместо реплик (read-your-writes) и отметка, что в
+# текущем запросе что-то записывалось; выставляются в start_request()
+_read_primary = contextvars.ContextVar('read_primary', default=False)
+_wrote = contextvars.ContextVar('wrote', default=False)
 
+# Профиль движка по умолчанию. PRAGMA применяются только к SQLite,
+# на каждом новом соединении пула.
+DEFAULT_PROFILE = {
+    'poolclass': None,
+    'pool_size': 5,
+    'max_overflow': 10,
+    'pool_timeout': 30,
+    'pool_pre_ping': False,
+    'echo': False,
+    'pragmas': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,
+        'temp_store': 'MEMORY',
+    },
+}
 
-def global_init(db_file):
-    global __factory
 
-    if __factory:
-        return
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+
+def make_profile(profile=None):
+    result = dict(DEFAULT_PROFILE)
+    result['pragmas'] = dict(DEFAULT_PROFILE['pragmas'])
+    if profile:
+        profile = dict(profile)
+        result['pragmas'].update(profile.pop('pragmas', None) or {})
+        result.update(profile)
+    return result
 
+
+def make_url(db_file):
     if not db_file or not db_file.strip():
         raise Exception("Необходимо указать файл базы данных.")
+    db_file = db_file.strip()
+    if '://' in db_file:
+        return sa.engine.make_url(db_file)
+    return sa.engine.make_url(f'sqlite:///{db_file}')
 
-    conn_str = f'sqlite:///{db_file.strip()}?check_same_thread=False'
-    print(f"Подключение к базе данных по адресу {conn_str}")
 
-    engine = sa.create_engine(conn_str, echo=False)
-    __factory = orm.sessionmaker(bind=engine)
+def _engine_kwargs(url, profile):
+    kwargs = {'echo': profile['echo'], 'pool_pre_ping': profile['pool_pre_ping']}
+    poolclass = profile['poolclass']
+    if poolclass is None and url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # у базы в памяти нет файла, поэтому все потоки должны делить одно соединение
+        poolclass = sa.pool.StaticPool
+    if poolclass is not None:
+        kwargs['poolclass'] = poolclass
+    if poolclass is None or issubclass(poolclass, sa.pool.QueuePool):
+        kwargs.update(pool_size=profile['pool_size'],
+                      max_overflow=profile['max_overflow'],
+                      pool_timeout=profile['pool_timeout'])
+    return kwargs
 
-    from . import __all_models
 
-    SqlAlchemyBase.metadata.create_all(engine)
+def _setup_engine(engine, url, profile):
+    sa.event.listen(engine, 'checkout', _connection_checked_out)
+    sa.event.listen(engine, 'checkin', _connection_checked_in)
+    if url.get_backend_name() == 'sqlite' and profile['pragmas']:
+        pragmas = profile['pragmas']
 
+        @sa.event.listens_for(engine, 'connect')
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+            cursor.close()
 
-def create_session() -> Session:
+
+def create_engine(db_file, profile=None):
+    profile = make_profile(profile)
+    url = make_url(db_file)
+    kwargs = _engine_kwargs(url, profile)
+    if url.get_backend_name() == 'sqlite':
+        kwargs['connect_args'] = {'check_same_thread': False}
+    engine = sa.create_engine(url, **kwargs)
+    _setup_engine(engine, url, profile)
+    return engine
+
+
+def create_async_engine(db_file, profile=None):
+    # Для асинхронного режима нужен драйвер с поддержкой asyncio (aiosqlite, asyncpg)
+    from sqlalchemy.ext.asyncio import create_async_engine as _create_async_engine
+
+    profile = make_profile(profile)
+    url = make_url(db_file)
+    if '+' not in url.drivername:
+        url = url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+    engine = _create_async_engine(url, **_engine_kwargs(url, profile))
+    _setup_engine(engine.sync_engine, url, profile)
+    return engine
+
+
+class RoutingSession(Session):
+    # Запись (flush, INSERT/UPDATE/DELETE, text()) идёт в основную базу, SELECT —
+    # в реплику, одну на всю сессию: снимки реплик разного возраста, и страница,
+    # собранная из нескольких, могла бы противоречить сама себе. После первой записи
+    # сессия до конца читает из основной, как и весь запрос, если
+    # start_request(read_primary=True).
+    def __init__(self, *args, replicas=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replicas = list(replicas)
+
+    def get_bind(self, mapper=None, *, clause=None, **kwargs):
+        if self._flushing or not isinstance(clause, sa.Select):
+            self.info['wrote'] = True
+            _wrote.set(True)
+        elif self.replicas and not self.info.get('wrote') and not _read_primary.get():
+            if self.info.get('replica') not in self.replicas:
+                self.info['replica'] = random.choice(self.replicas)
+            return self.info['replica']
+        return super().get_bind(mapper, clause=clause, **kwargs)
+
+
+def global_init(db_file, profile=None, upgrade=True, replicas=()):
+    # Только запоминает настройки: движок, сессии и проверка версии схемы
+    # появятся при первом обращении к базе (см. _session_factory).
+    # replicas — пути или URL баз только для чтения (см. snapshot())
+    global __config
+
+    if __config:
+        return
+    __config = {'db_file': db_file, 'profile': profile, 'upgrade': upgrade, 'replicas': list(replicas)}
+
+
+def async_global_init(db_file, profile=None):
+    global __async_config
+
+    if __async_config:
+        return
+    __async_config = {'db_file': db_file, 'profile': profile}
+
+
+def _session_factory():
     global __factory
-    return __factory()
\ No newline at end of file
+
+    if __factory is None:
+        with __init_lock:
+            if __factory is None:
+                if not __config:
+                    raise Exception("Сначала вызовите global_init().")
+                # Модели нужны целиком, иначе не разрешатся строковые relationship('User')
+                from . import migrations, __all_models
+
+                engine = create_engine(__config['db_file'], __config['profile'])
+                print(f"Подключение к базе данных по адресу {engine.url.render_as_string(hide_password=True)}")
+                migrations.ensure(engine, __config['upgrade'])
+                replicas = [create_engine(replica, __config['profile']) for replica in __config['replicas']]
+                # Одна сессия на поток (т.е. на запрос); закрывается в remove_session()
+                __factory = orm.scoped_session(orm.sessionmaker(bind=engine, class_=RoutingSession,
+                                                                replicas=replicas))
+    return __factory
+
+
+def _async_session_factory():
+    # Схему проверяет синхронная сторона, здесь только движок и фабрика AsyncSession
+    global __async_factory
+
+    if __async_factory is None:
+        with __init_lock:
+            if __async_factory is None:
+                if not __async_config:
+                    raise Exception("Сначала вызовите async_global_init().")
+                from sqlalchemy.ext.asyncio import async_sessionmaker
+
+                engine = create_async_engine(__async_config['db_file'], __async_config['profile'])
+                __async_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+    if __factory is None:
+        _session_factory()
+    return __async_factory
+
+
+def get_engine():
+    return _session_factory().session_factory.kw['bind']
+
+
+def get_replica_engines():
+    return _session_factory().session_factory.kw['replicas']
+
+
+def create_session() -> Session:
+    return _session_factory()()
+
+
+def start_request(read_primary=False):
+    _read_primary.set(read_primary)
+    _wrote.set(False)
+
+
+def wrote():
+    return _wrote.get()
+
+
+@contextlib.contextmanager
+def primary():
+    # Чтение из основной базы: проверки перед записью и кэши на весь процесс,
+    # которые нельзя заполнять с отстающей реплики. Годится и как декоратор
+    token = _read_primary.set(True)
+    try:
+        yield
+    finally:
+        _read_primary.reset(token)
+
+
+def snapshot(db_file, target_file):
+    # Копия SQLite-базы для реплики через backup API: целостная даже при
+    # одновременной записи, читатели реплики просто подождут (busy_timeout)
+    source = sqlite3.connect(make_url(db_file).database)
+    target = sqlite3.connect(make_url(target_file).database)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def get_async_engine():
+    return _async_session_factory().kw['bind']
+
+
+def create_async_session():
+    return _async_session_factory()()
+
+
+def remove_session():
+    if __factory is not None:
+        __factory.remove()
+
+
+def dispose():
+    # Для мастер-процесса перед fork (gunicorn --preload и т.п.): закрыть пулы,
+    # чтобы воркеры не унаследовали открытые соединения
+    for engine in _engines():
+        engine.dispose()
+
+
+async def dispose_async():
+    if __async_factory is not None:
+        await __async_factory.kw['bind'].dispose()
+
+
+def _engines():
+    if __factory is not None:
+        yield __factory.session_factory.kw['bind']
+        yield from __factory.session_factory.kw['replicas']
+    if __async_factory is not None:
+        yield __async_factory.kw['bind'].sync_engine
+
+
+def _after_fork_in_child():
+    # Соединения родителя в дочернем процессе не закрываем (они ещё нужны
+    # родителю), а просто забываем; пул откроет новые
+    for engine in _engines():
+        engine.dispose(close=False)
+    if __factory is not None:
+        __factory.registry.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def stats():
+    return {name: counter.get() for name, counter in __counters.items()}
+
+
+def _count(name, delta):
+    counter = __counters[name]
+    counter.set(counter.get() + delta)
+
+
+def _connection_checked_out(dbapi_connection, connection_record, connection_proxy):
+    _count('connections', 1)
+
+
+def _connection_checked_in(dbapi_connection, connection_record):
+    _count('connections', -1)
+
+
+@sa.event.listens_for(Session, 'after_transaction_create')
+def _session_opened(session, transaction):
+    if transaction.parent is None:
+        _count('sessions', 1)
+
+
+@sa.event.listens_for(Session, 'after_transaction_end')
+def _session_closed(session, transaction):
+    if transaction.parent is None:
+        _count('sessions', -1)
+
@@ -1,14 +1,31 @@
+import datetime
 import sqlalchemy
 from sqlalchemy import orm
 from .db_session import SqlAlchemyBase
 
 
+department_members = sqlalchemy.Table(
+    'department_members',
+    SqlAlchemyBase.metadata,
+    sqlalchemy.Column('department_id', sqlalchemy.Integer,
+                      sqlalchemy.ForeignKey('departments.id', ondelete='CASCADE'), primary_key=True),
+    sqlalchemy.Column('user_id', sqlalchemy.Integer,
+                      sqlalchemy.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+    sqlalchemy.Index('ix_department_members_user_id', 'user_id', 'department_id')
+)
+
+
 class Department(SqlAlchemyBase):
     __tablename__ = 'departments'
     id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True, autoincrement=True)
     title = sqlalchemy.Column(sqlalchemy.String, nullable=True)
-    chief = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey('users.id'), nullable=True)
+    chief = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey('users.id'), nullable=True, index=True)
     members = sqlalchemy.Column(sqlalchemy.String, nullable=True)
-    email = sqlalchemy.Column(sqlalchemy.Integer, nullable=True)
+    email = sqlalchemy.Column(sqlalchemy.String, nullable=True)
+    modified_date = sqlalchemy.Column(sqlalchemy.DateTime, default=datetime.datetime.now,
+                                      onupdate=datetime.datetime.now, index=True)
 
-    user = orm.relationship("User")
+    user = orm.relationship("User", lazy="joined")
+    member_users = orm.relationship("User",
+                                    secondary="department_members",
+                                    order_by="User.id")
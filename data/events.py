@@ -0,0 +1,46 @@
+import sqlalchemy as sa
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+
+# Подписчики на изменения моделей, которые уже зафиксированы в базе.
+# Изменения копятся в session.info во время flush и раздаются после commit,
+# так что подписчик никогда не увидит данные откатанной транзакции.
+_listeners = []
+
+
+def on_commit(models, callback=None):
+    if not isinstance(models, (list, tuple)):
+        models = (models,)
+    if callback is None:
+        return lambda func: on_commit(models, func)
+    _listeners.append((tuple(models), callback))
+    return callback
+
+
+def touch(session, model, ids):
+    # Для записей в обход ORM (Core update/insert/delete)
+    changes = session.info.setdefault('committed_changes', {})
+    changes.setdefault(model, set()).update(ids)
+
+
+@sa.event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        # у новых объектов identity ещё не выставлена, но первичный ключ уже известен
+        touch(session, type(obj), inspect(obj).mapper.primary_key_from_instance(obj)[:1])
+
+
+@sa.event.listens_for(Session, 'after_commit')
+def _dispatch_changes(session):
+    changes = session.info.pop('committed_changes', None)
+    if not changes:
+        return
+    for models, callback in _listeners:
+        for model, ids in changes.items():
+            if issubclass(model, models):
+                callback(model, ids)
+
+
+@sa.event.listens_for(Session, 'after_rollback')
+def _drop_changes(session):
+    session.info.pop('committed_changes', None)
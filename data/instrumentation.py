@@ -0,0 +1,164 @@
+import cProfile
+import heapq
+import os
+import threading
+import time
+
+import sqlalchemy as sa
+from flask import abort, g, has_request_context, request
+
+# Необязательный сбор метрик: задержки маршрутов (гистограммы), число и время
+# SQL-запросов на маршрут и самые медленные запросы с параметрами.
+# Всё отдаётся на /metrics в текстовом формате Prometheus (только с localhost),
+# а на каждый ответ вешаются заголовки X-SQL-Queries и Server-Timing.
+# С profile_dir запрос с ?profile=1 дополнительно сохраняет дамп cProfile.
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    def __init__(self, slow_queries=20):
+        self.slow_queries = slow_queries
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._requests = {}
+            self._sql = {}
+            self._slow = []
+
+    def observe_request(self, route, method, status, seconds):
+        with self._lock:
+            item = self._requests.setdefault((route, method, status),
+                                             {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0})
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    item['buckets'][i] += 1
+            item['sum'] += seconds
+            item['count'] += 1
+
+    def observe_query(self, route, statement, parameters, seconds):
+        with self._lock:
+            item = self._sql.setdefault(route, {'count': 0, 'seconds': 0.0})
+            item['count'] += 1
+            item['seconds'] += seconds
+            entry = (seconds, route, ' '.join(statement.split()), repr(parameters)[:200])
+            if len(self._slow) < self.slow_queries:
+                heapq.heappush(self._slow, entry)
+            elif seconds > self._slow[0][0]:
+                heapq.heapreplace(self._slow, entry)
+
+    def slowest(self):
+        with self._lock:
+            return sorted(self._slow, reverse=True)
+
+    def render(self):
+        lines = ['# HELP mars_http_request_duration_seconds Время обработки запроса',
+                 '# TYPE mars_http_request_duration_seconds histogram']
+        with self._lock:
+            requests = sorted(self._requests.items())
+            sql = sorted(self._sql.items())
+        for (route, method, status), item in requests:
+            labels = f'route="{_escape(route)}",method="{method}",status="{status}"'
+            for bound, count in zip(BUCKETS, item['buckets']):
+                lines.append(f'mars_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'mars_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {item["count"]}')
+            lines.append(f'mars_http_request_duration_seconds_sum{{{labels}}} {item["sum"]:.6f}')
+            lines.append(f'mars_http_request_duration_seconds_count{{{labels}}} {item["count"]}')
+
+        lines += ['# HELP mars_sql_statements_total Выполнено SQL-запросов',
+                  '# TYPE mars_sql_statements_total counter']
+        lines += [f'mars_sql_statements_total{{route="{_escape(route)}"}} {item["count"]}' for route, item in sql]
+        lines += ['# HELP mars_sql_duration_seconds_total Суммарное время SQL-запросов',
+                  '# TYPE mars_sql_duration_seconds_total counter']
+        lines += [f'mars_sql_duration_seconds_total{{route="{_escape(route)}"}} {item["seconds"]:.6f}'
+                  for route, item in sql]
+
+        lines += ['# HELP mars_sql_slow_query_seconds Самые медленные SQL-запросы',
+                  '# TYPE mars_sql_slow_query_seconds gauge']
+        for seconds, route, statement, parameters in self.slowest():
+            lines.append(f'mars_sql_slow_query_seconds{{route="{_escape(route)}",'
+                         f'statement="{_escape(statement)}",params="{_escape(parameters)}"}} {seconds:.6f}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def _route():
+    if has_request_context():
+        return request.url_rule.rule if request.url_rule else 'unmatched'
+    return 'background'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info['query_started'].pop()
+    metrics.observe_query(_route(), statement, parameters, seconds)
+    if has_request_context():
+        g.sql_queries = g.get('sql_queries', 0) + 1
+        g.sql_seconds = g.get('sql_seconds', 0.0) + seconds
+
+
+def init_app(app, profile_dir=None):
+    # Слушатели вешаются на класс Engine, поэтому видят и движок из
+    # db_session.global_init, и любые созданные позже
+    if not sa.event.contains(sa.engine.Engine, 'before_cursor_execute', _before_cursor_execute):
+        sa.event.listen(sa.engine.Engine, 'before_cursor_execute', _before_cursor_execute)
+        sa.event.listen(sa.engine.Engine, 'after_cursor_execute', _after_cursor_execute)
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+        if profile_dir and request.args.get('profile'):
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # в другом потоке уже идёт профилирование
+                return
+            g.profiler = profiler
+
+    @app.after_request
+    def add_timing_headers(response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+        g.response_status = response.status_code
+        total = (time.perf_counter() - started) * 1000
+        response.headers['X-SQL-Queries'] = str(g.get('sql_queries', 0))
+        response.headers['Server-Timing'] = (f'db;dur={g.get("sql_seconds", 0.0) * 1000:.1f}, '
+                                             f'total;dur={total:.1f}')
+        return response
+
+    @app.teardown_request
+    def record_request(exception=None):
+        started = g.pop('request_started', None)
+        if started is None:
+            return
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            name = _route().strip('/').replace('/', '_').replace('<', '').replace('>', '') or 'index'
+            profiler.dump_stats(os.path.join(profile_dir, f'{time.strftime("%Y%m%d-%H%M%S")}-{name}.prof'))
+        status = 500 if exception is not None else g.get('response_status', 200)
+        metrics.observe_request(_route(), request.method, status, time.perf_counter() - started)
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        if request.remote_addr not in LOCAL_ADDRESSES:
+            abort(404)
+        return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+    return metrics
@@ -4,24 +4,43 @@ from sqlalchemy import orm
 from .db_session import SqlAlchemyBase
 
 
+job_collaborators = sqlalchemy.Table(
+    'job_collaborators',
+    SqlAlchemyBase.metadata,
+    sqlalchemy.Column('job_id', sqlalchemy.Integer,
+                      sqlalchemy.ForeignKey('jobs.id', ondelete='CASCADE'), primary_key=True),
+    sqlalchemy.Column('user_id', sqlalchemy.Integer,
+                      sqlalchemy.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+    sqlalchemy.Index('ix_job_collaborators_user_id', 'user_id', 'job_id')
+)
+
+
 class Jobs(SqlAlchemyBase):
     __tablename__ = 'jobs'
     id = sqlalchemy.Column(sqlalchemy.Integer,
                            primary_key=True, autoincrement=True)
     team_leader = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey('users.id'),
-                                    nullable=True)
+                                    nullable=True, index=True)
     job = sqlalchemy.Column(sqlalchemy.String, nullable=True)
     work_size = sqlalchemy.Column(sqlalchemy.Integer, nullable=True)
     collaborators = sqlalchemy.Column(sqlalchemy.String, nullable=True)
     start_date = sqlalchemy.Column(sqlalchemy.DateTime, default=datetime.datetime.now)
     end_date = sqlalchemy.Column(sqlalchemy.DateTime, default=datetime.datetime.now)
     is_finished = sqlalchemy.Column(sqlalchemy.Boolean, default=True)
+    modified_date = sqlalchemy.Column(sqlalchemy.DateTime, default=datetime.datetime.now,
+                                      onupdate=datetime.datetime.now, index=True)
 
-    user = orm.relationship("User")
+    user = orm.relationship("User", lazy="joined")
 
     categories = orm.relationship("Category",
                                   secondary="association",
-                                  backref="jobs")
+                                  backref="jobs",
+                                  order_by="Category.level",
+                                  lazy="selectin")
+
+    collaborator_users = orm.relationship("User",
+                                          secondary="job_collaborators",
+                                          order_by="User.id")
 
     def __repr__(self):
         return f'<Job> {self.job}'
@@ -0,0 +1,87 @@
+import importlib
+import pkgutil
+
+import sqlalchemy as sa
+
+# Версия схемы хранится в таблице schema_version (одна строка). Миграции —
+# модули mNNNN_<название>.py этого пакета с функцией upgrade(conn); применяются
+# по порядку номеров, каждая в своей транзакции вместе с записью новой версии.
+# Все миграции идемпотентны, поэтому старая база без schema_version просто
+# проходит их с нуля. При старте приложения это одна проверка версии,
+# а обновлять базу лучше отдельно, до запуска воркеров:
+#   python -m data.migrations db/blogs.db
+#   python -m data.migrations db/blogs.db current
+
+schema_version = sa.Table('schema_version', sa.MetaData(),
+                          sa.Column('version', sa.Integer, nullable=False))
+
+
+class SchemaOutdated(RuntimeError):
+    pass
+
+
+def migrations():
+    found = [(int(info.name[1:5]), info.name) for info in pkgutil.iter_modules(__path__)
+             if info.name[:1] == 'm' and info.name[1:5].isdigit()]
+    return sorted(found)
+
+
+def head():
+    return migrations()[-1][0]
+
+
+def current_version(engine):
+    with engine.connect() as conn:
+        try:
+            return conn.scalar(sa.select(schema_version.c.version)) or 0
+        except (sa.exc.OperationalError, sa.exc.ProgrammingError):
+            # таблицы ещё нет
+            return 0
+
+
+def upgrade(engine, target=None):
+    version = current_version(engine)
+    target = head() if target is None else target
+    applied = []
+    for number, name in migrations():
+        if version < number <= target:
+            module = importlib.import_module(f'{__name__}.{name}')
+            with engine.begin() as conn:
+                module.upgrade(conn)
+                schema_version.create(conn, checkfirst=True)
+                conn.execute(schema_version.delete())
+                conn.execute(schema_version.insert().values(version=number))
+            applied.append(name)
+    return applied
+
+
+def ensure(engine, upgrade_schema=True):
+    version, latest = current_version(engine), head()
+    if version == latest:
+        return
+    if version > latest:
+        raise SchemaOutdated(f'Версия схемы базы ({version}) новее, чем знает код ({latest})')
+    if not upgrade_schema:
+        raise SchemaOutdated(f'Схема базы устарела: версия {version}, нужна {latest}. '
+                             f'Запустите python -m data.migrations')
+    for name in upgrade(engine):
+        print(f'Применена миграция {name}')
+
+
+def create_indexes(conn, tables):
+    for table in tables:
+        # Индекс по колонке, которой в старой базе ещё нет, создаст миграция, добавляющая колонку
+        existing = {column['name'] for column in sa.inspect(conn).get_columns(table.name)}
+        for index in table.indexes:
+            if {column.name for column in index.columns} <= existing:
+                index.create(conn, checkfirst=True)
+
+
+def add_columns(conn, table, *names):
+    # create_all не добавляет колонки в существующие таблицы
+    existing = {column['name'] for column in sa.inspect(conn).get_columns(table.name)}
+    for name in names:
+        if name not in existing:
+            column = table.c[name]
+            conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {name} '
+                                 f'{column.type.compile(conn.dialect)}')
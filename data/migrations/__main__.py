@@ -0,0 +1,21 @@
+import sys
+
+from .. import db_session
+from . import current_version, head, upgrade
+
+
+def main(argv):
+    db_file = argv[1] if len(argv) > 1 else 'db/blogs.db'
+    engine = db_session.create_engine(db_file)
+    if len(argv) > 2 and argv[2] == 'current':
+        print(f'Версия схемы: {current_version(engine)} (последняя {head()})')
+        return
+    applied = upgrade(engine, int(argv[2]) if len(argv) > 2 else None)
+    for name in applied:
+        print(f'Применена миграция {name}')
+    if not applied:
+        print('Схема уже актуальна')
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,7 @@
+from .. import __all_models
+from ..db_session import SqlAlchemyBase
+
+
+def upgrade(conn):
+    # Новая база получает все таблицы по моделям; в старой досоздаются недостающие
+    SqlAlchemyBase.metadata.create_all(conn)
@@ -0,0 +1,24 @@
+import sqlalchemy as sa
+
+from ..departments import Department, department_members
+from ..jobs import Jobs, job_collaborators
+from ..users import User
+
+
+def parse_ids(value):
+    return {int(part) for part in (value or '').split(',') if part.strip().isdigit()}
+
+
+def upgrade(conn):
+    # Переносит списки id из строк jobs.collaborators и departments.members
+    # в таблицы связей. Таблицы перестраиваются целиком.
+    user_ids = set(conn.scalars(sa.select(User.id)))
+    for table, owner, column, owner_key in (
+            (job_collaborators, Jobs.id, Jobs.collaborators, 'job_id'),
+            (department_members, Department.id, Department.members, 'department_id')):
+        rows = [{owner_key: owner_id, 'user_id': user_id}
+                for owner_id, value in conn.execute(sa.select(owner, column))
+                for user_id in sorted(parse_ids(value) & user_ids)]
+        conn.execute(table.delete())
+        if rows:
+            conn.execute(table.insert(), rows)
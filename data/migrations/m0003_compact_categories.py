@@ -0,0 +1,32 @@
+import sqlalchemy as sa
+
+from ..category import Category, association_table, forget_categories
+from . import create_indexes
+
+
+def upgrade(conn):
+    # Склеивает дубликаты категорий одного уровня в строку с наименьшим id,
+    # убирает повторы в association и добавляет уникальные индексы
+    category = Category.__table__
+    keep = dict(conn.execute(sa.select(category.c.level, sa.func.min(category.c.id))
+                             .group_by(category.c.level)).all())
+    duplicates = [{'old_id': category_id, 'new_id': keep[level]}
+                  for category_id, level in conn.execute(sa.select(category.c.id, category.c.level))
+                  if category_id != keep[level]]
+    if duplicates:
+        conn.execute(association_table.update()
+                     .where(association_table.c.category == sa.bindparam('old_id'))
+                     .values(category=sa.bindparam('new_id')),
+                     duplicates)
+        conn.execute(category.delete().where(category.c.id.not_in(list(keep.values()))))
+
+    pairs = conn.execute(sa.select(association_table.c.jobs, association_table.c.category)
+                         .distinct()).all()
+    total = conn.scalar(sa.select(sa.func.count()).select_from(association_table))
+    if total != len(pairs):
+        conn.execute(association_table.delete())
+        conn.execute(association_table.insert(),
+                     [{'jobs': jobs, 'category': category_id} for jobs, category_id in pairs])
+
+    create_indexes(conn, [category, association_table])
+    forget_categories()
@@ -0,0 +1,8 @@
+from .. import __all_models
+from ..db_session import SqlAlchemyBase
+from . import create_indexes
+
+
+def upgrade(conn):
+    # create_all не добавляет новые индексы в уже существующие таблицы
+    create_indexes(conn, SqlAlchemyBase.metadata.sorted_tables)
@@ -0,0 +1,24 @@
+from ..search import FTS_TABLES, rebuild
+
+
+def upgrade(conn):
+    # Полнотекстовый поиск есть только в SQLite (FTS5)
+    if conn.dialect.name != 'sqlite':
+        return
+    for name, (source, columns) in FTS_TABLES.items():
+        new = ', '.join(f'new.{column}' for column in columns)
+        old = ', '.join(f'old.{column}' for column in columns)
+        columns = ', '.join(columns)
+        # external content: сам текст хранится в исходной таблице, в индексе только токены;
+        # prefix: отдельные индексы для префиксов из 2 и 3 букв, иначе "ма*" сливает тысячи списков
+        conn.exec_driver_sql(f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5("
+                             f"{columns}, content='{source}', content_rowid='id', "
+                             f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')")
+        conn.exec_driver_sql(f"CREATE TRIGGER IF NOT EXISTS {name}_ai AFTER INSERT ON {source} BEGIN "
+                             f"INSERT INTO {name}(rowid, {columns}) VALUES (new.id, {new}); END")
+        conn.exec_driver_sql(f"CREATE TRIGGER IF NOT EXISTS {name}_ad AFTER DELETE ON {source} BEGIN "
+                             f"INSERT INTO {name}({name}, rowid, {columns}) VALUES ('delete', old.id, {old}); END")
+        conn.exec_driver_sql(f"CREATE TRIGGER IF NOT EXISTS {name}_au AFTER UPDATE OF {columns} ON {source} BEGIN "
+                             f"INSERT INTO {name}({name}, rowid, {columns}) VALUES ('delete', old.id, {old}); "
+                             f"INSERT INTO {name}(rowid, {columns}) VALUES (new.id, {new}); END")
+    rebuild(conn)
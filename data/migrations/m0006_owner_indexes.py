@@ -0,0 +1,11 @@
+from ..departments import Department
+from ..jobs import Jobs
+from ..news import News
+from . import create_indexes
+
+
+def upgrade(conn):
+    create_indexes(conn, [News.__table__, Jobs.__table__, Department.__table__])
+    if conn.dialect.name == 'sqlite':
+        # статистика для планировщика, чтобы он выбирал новые индексы
+        conn.exec_driver_sql('ANALYZE')
@@ -0,0 +1,19 @@
+import datetime
+
+from ..departments import Department
+from ..jobs import Jobs
+from ..news import News
+from ..users import User
+from . import add_columns, create_indexes
+
+
+def upgrade(conn):
+    # modified_date нужна для ETag в /api/v1 (см. api.py): max(modified_date) и count(*)
+    # меняются при любом добавлении, правке или удалении
+    now = datetime.datetime.now()
+    tables = [User.__table__, News.__table__, Jobs.__table__, Department.__table__]
+    for table in tables:
+        add_columns(conn, table, 'modified_date')
+        value = table.c.created_date if table is News.__table__ else now
+        conn.execute(table.update().where(table.c.modified_date.is_(None)).values(modified_date=value))
+    create_indexes(conn, tables)
@@ -0,0 +1,9 @@
+from ..news import News
+from . import create_indexes
+
+
+def upgrade(conn):
+    # Индексы для ETag новостей в /api/v1 (см. queries.news_version_query)
+    create_indexes(conn, [News.__table__])
+    if conn.dialect.name == 'sqlite':
+        conn.exec_driver_sql('ANALYZE')
@@ -7,6 +7,20 @@ from .db_session import SqlAlchemyBase
 
 class News(SqlAlchemyBase):
     __tablename__ = 'news'
+    __table_args__ = (
+        sqlalchemy.Index('ix_news_created_date_id', 'created_date', 'id'),
+        # Лента = свои записи (по автору) + чужие публичные (частичный индекс)
+        sqlalchemy.Index('ix_news_user_id_created_date', 'user_id', 'created_date', 'id'),
+        sqlalchemy.Index('ix_news_public_created_date', 'created_date', 'id',
+                         sqlite_where=sqlalchemy.text('is_private = 0'),
+                         postgresql_where=sqlalchemy.text('is_private = false')),
+        # ETag в api.py: max(modified_date) и count(*) по тем же двум веткам; is_private
+        # в частичном индексе лишний по смыслу, но с ним индекс покрывающий
+        sqlalchemy.Index('ix_news_user_id_is_private_modified_date', 'user_id', 'is_private', 'modified_date'),
+        sqlalchemy.Index('ix_news_public_modified_date', 'modified_date', 'is_private',
+                         sqlite_where=sqlalchemy.text('is_private = 0'),
+                         postgresql_where=sqlalchemy.text('is_private = false')),
+    )
 
     id = sqlalchemy.Column(sqlalchemy.Integer,
                            primary_key=True, autoincrement=True)
@@ -15,7 +29,9 @@ class News(SqlAlchemyBase):
     created_date = sqlalchemy.Column(sqlalchemy.DateTime,
                                      default=datetime.datetime.now)
     is_private = sqlalchemy.Column(sqlalchemy.Boolean, default=True)
+    modified_date = sqlalchemy.Column(sqlalchemy.DateTime, default=datetime.datetime.now,
+                                      onupdate=datetime.datetime.now, index=True)
 
     user_id = sqlalchemy.Column(sqlalchemy.Integer,
                                 sqlalchemy.ForeignKey("users.id"))
-    user = orm.relationship('User')
+    user = orm.relationship('User', lazy='joined')
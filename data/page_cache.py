@@ -0,0 +1,180 @@
+import datetime
+import functools
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from flask import Response, request
+from flask_login import current_user
+
+from . import events
+from .cache import LRUCache
+from .category import Category
+from .departments import Department
+from .jobs import Jobs
+from .news import News
+from .users import User
+
+# Кэш готовых HTML-страниц. Ключ — путь с параметрами, пользователь и версии
+# таблиц, из которых страница собрана. После commit, затронувшего таблицу,
+# её версия меняется, и все страницы с её участием перестают находиться в кэше.
+# Версия — это время изменения, она же отдаётся в Last-Modified.
+
+
+class MemoryBackend:
+    def __init__(self, maxsize=512):
+        self._cache = LRUCache(maxsize=maxsize)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value, ttl=None):
+        self._cache.set(key, value, ttl=ttl)
+
+
+class FileBackend:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as file:
+                value, expires = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires is not None and expires < time.time():
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + ttl if ttl is not None else None
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}'
+        with open(tmp_path, 'wb') as file:
+            pickle.dump((value, expires), file)
+        os.replace(tmp_path, path)
+
+
+class SqliteBackend:
+    # Общий для нескольких процессов кэш в отдельном файле SQLite —
+    # замена внешнему хранилищу вроде Redis
+
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA busy_timeout=5000')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS page_cache '
+                                 '(key TEXT PRIMARY KEY, value BLOB, expires REAL)')
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            row = self._connection.execute('SELECT value, expires FROM page_cache WHERE key = ?',
+                                           (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._connection.execute('INSERT OR REPLACE INTO page_cache (key, value, expires) VALUES (?, ?, ?)',
+                                     (key, pickle.dumps(value), expires))
+
+
+def make_backend(url):
+    # "memory", "memory:1024", "file:/var/cache/mars", "sqlite:/var/cache/mars.db", "off"
+    kind, _, arg = (url or 'memory').partition(':')
+    if kind == 'off':
+        return None
+    if kind == 'memory':
+        return MemoryBackend(int(arg)) if arg else MemoryBackend()
+    if kind == 'file':
+        return FileBackend(arg)
+    if kind == 'sqlite':
+        return SqliteBackend(arg)
+    raise ValueError(f'Неизвестный backend кэша страниц: {url}')
+
+
+class PageCache:
+    def __init__(self, backend=None, ttl=300):
+        self.backend = backend
+        self.ttl = ttl
+
+    def configure(self, url, ttl=None):
+        self.backend = make_backend(url)
+        if ttl is not None:
+            self.ttl = ttl
+
+    def version(self, table):
+        version = self.backend.get(f'version:{table}')
+        if version is None:
+            version = self.invalidate(table)
+        return version
+
+    def invalidate(self, *tables):
+        if self.backend is None:
+            return None
+        version = time.time()
+        for table in tables:
+            self.backend.set(f'version:{table}', version)
+        return version
+
+    def lookup(self, tables):
+        # -> (ключ, версии таблиц, сохранённая запись или None)
+        versions = [self.version(table) for table in tables]
+        user = f'user:{current_user.id}' if current_user.is_authenticated else 'anonymous'
+        key = 'page:' + hashlib.sha1(f'{request.full_path}|{user}|{versions!r}'.encode()).hexdigest()
+        return key, versions, self.backend.get(key)
+
+    def store(self, key, body):
+        body = body.encode()
+        entry = {'body': body, 'etag': hashlib.sha1(body).hexdigest()}
+        self.backend.set(key, entry, self.ttl)
+        return entry
+
+    def respond(self, entry, versions):
+        response = Response(entry['body'], mimetype='text/html')
+        response.set_etag(entry['etag'])
+        response.last_modified = datetime.datetime.fromtimestamp(max(versions), datetime.timezone.utc)
+        response.cache_control.no_cache = True
+        response.cache_control.private = True
+        response.vary.add('Cookie')
+        return response.make_conditional(request)
+
+    def applies(self):
+        return self.backend is not None and request.method == 'GET' and not request.args.get('stream')
+
+    def cached(self, *tables):
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.applies():
+                    return view(*args, **kwargs)
+                key, versions, entry = self.lookup(tables)
+                if entry is None:
+                    body = view(*args, **kwargs)
+                    if not isinstance(body, str):
+                        return body
+                    entry = self.store(key, body)
+                return self.respond(entry, versions)
+            return wrapper
+        return decorator
+
+
+page_cache = PageCache(MemoryBackend())
+
+
+CACHED_MODELS = (News, Jobs, Department, Category, User)
+
+
+@events.on_commit(CACHED_MODELS)
+def _invalidate_pages(model, ids):
+    page_cache.invalidate(model.__tablename__)
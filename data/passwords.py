@@ -0,0 +1,97 @@
+import concurrent.futures
+import os
+import threading
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Хеширование паролей вынесено в ограниченный пул потоков: hashlib отпускает GIL
+# на время scrypt/pbkdf2, а очередь ограничена, поэтому волна логинов
+# не отнимает у остальных маршрутов все потоки сервера. Если мест в очереди нет,
+# запрос не ждёт их, а через timeout секунд получает PasswordPoolBusy (503):
+# иначе поток сервера простаивал бы в ожидании так же, как без пула.
+
+DEFAULT_SETTINGS = {
+    'method': 'scrypt',
+    'salt_length': 16,
+    'workers': os.cpu_count() or 2,
+    'queue_size': None,
+    'timeout': 0.05,
+}
+
+
+class PasswordPoolBusy(Exception):
+    pass
+
+
+_settings = dict(DEFAULT_SETTINGS)
+_executor = None
+_slots = None
+_method_prefix = None
+_lock = threading.Lock()
+
+
+def configure(**settings):
+    global _executor, _slots, _method_prefix
+    unknown = settings.keys() - DEFAULT_SETTINGS.keys()
+    if unknown:
+        raise TypeError(f"Неизвестные параметры хеширования: {', '.join(sorted(unknown))}")
+    with _lock:
+        _settings.update((key, value) for key, value in settings.items() if value is not None)
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = None
+        _slots = None
+        _method_prefix = None
+
+
+def settings():
+    return dict(_settings)
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, _settings['method'], _settings['salt_length'])
+
+
+def verify_password(hashed_password, password):
+    if not hashed_password:
+        return False
+    return _run(check_password_hash, hashed_password, password)
+
+
+def needs_rehash(hashed_password):
+    if not hashed_password:
+        return False
+    return hashed_password.split('$', 1)[0] != _current_prefix()
+
+
+def _current_prefix():
+    # werkzeug дописывает параметры по умолчанию ("scrypt" -> "scrypt:32768:8:1"),
+    # поэтому нормализованный префикс берём из настоящего хеша
+    global _method_prefix
+    if _method_prefix is None:
+        _method_prefix = generate_password_hash('', _settings['method'], 1).split('$', 1)[0]
+    return _method_prefix
+
+
+def _pool():
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            workers = _settings['workers']
+            _executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers,
+                                                              thread_name_prefix='password-hash')
+            _slots = threading.BoundedSemaphore(_settings['queue_size'] or workers * 4)
+        return _executor, _slots
+
+
+def _run(func, *args):
+    executor, slots = _pool()
+    if not slots.acquire(timeout=_settings['timeout']):
+        raise PasswordPoolBusy()
+    try:
+        future = executor.submit(func, *args)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    return future.result()
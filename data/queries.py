@@ -0,0 +1,193 @@
+import datetime
+
+import sqlalchemy as sa
+from sqlalchemy import orm
+from sqlalchemy.ext.compiler import compiles
+
+from . import db_session
+from .category import Category, association_table
+from .departments import Department, department_members
+from .jobs import Jobs, job_collaborators
+from .news import News
+from .users import User
+
+PAGE_SIZE = 20
+YIELD_PER = 100
+
+
+def news_cursor(news):
+    return f'{news.created_date.isoformat()},{news.id}'
+
+
+def parse_news_cursor(value):
+    created_date, news_id = value.rsplit(',', 1)
+    return datetime.datetime.fromisoformat(created_date), int(news_id)
+
+
+def news_feed(db_sess, user=None, after=None, limit=PAGE_SIZE):
+    return _fetch(db_sess, news_feed_query(user, after, limit + 1), limit)
+
+
+def stream_news_feed(user=None):
+    return _stream(news_feed_query(user))
+
+
+def news_feed_query(user=None, after=None, limit=None):
+    # Вместо "своё ИЛИ публичное" — UNION двух выборок, каждая идёт по своему
+    # индексу (ix_news_user_id_created_date и частичный ix_news_public_created_date)
+    # и сразу обрезается до limit; сортируются потом только эти строки
+    branches = [News.is_private == False]
+    if user is not None and user.is_authenticated:
+        branches.append(News.user_id == user.id)
+    selects = []
+    for condition in branches:
+        branch = sa.select(News.id, News.created_date).where(condition)
+        if after is not None:
+            branch = branch.where(sa.tuple_(News.created_date, News.id) > after)
+        branch = branch.order_by(News.created_date, News.id).limit(limit).subquery()
+        selects.append(sa.select(branch))
+    feed = (sa.union(*selects) if len(selects) > 1 else selects[0]).subquery()
+    return (sa.select(News)
+            .join(feed, feed.c.id == News.id)
+            .options(orm.joinedload(News.user))
+            .order_by(News.created_date, News.id))
+
+
+def news_version_query(user=None):
+    # max(modified_date) и count(*) видимых записей для ETag в api.py. Как и в ленте,
+    # вместо "своё ИЛИ публичное" — непересекающиеся ветки, каждая по своему индексу,
+    # покрывающему modified_date: публичные и свои непубличные
+    columns = (sa.func.max(News.modified_date).label('last'), sa.func.count().label('rows'))
+    branches = [sa.select(*columns).where(News.is_private == False)]
+    if user is not None and user.is_authenticated:
+        branches.append(sa.select(*columns).where(News.user_id == user.id, News.is_private.is_not(False)))
+    versions = sa.union_all(*branches).subquery()
+    return sa.select(sa.func.max(versions.c.last), sa.func.sum(versions.c.rows))
+
+
+def visible_news(query, user=None):
+    # Чужие личные записи не показываются никому
+    if user is not None and user.is_authenticated:
+        return query.where((News.user_id == user.id) | (News.is_private == False))
+    return query.where(News.is_private == False)
+
+
+def owned_by(column, user):
+    # Администратор (id 1) может править всё; проверка в Python, чтобы в SQL
+    # не попадало "... OR true" и запрос оставался поиском по ключу
+    if user.id == 1:
+        return sa.true()
+    return column == user.id
+
+
+class hours_between(sa.sql.functions.FunctionElement):
+    type = sa.Float()
+    inherit_cache = True
+
+
+@compiles(hours_between)
+def _hours_between(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return (f'EXTRACT(EPOCH FROM ({compiler.process(end, **kw)} - '
+            f'{compiler.process(start, **kw)})) / 3600')
+
+
+@compiles(hours_between, 'sqlite')
+def _hours_between_sqlite(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return (f'(julianday({compiler.process(end, **kw)}) - '
+            f'julianday({compiler.process(start, **kw)})) * 24')
+
+
+def job_summaries(db_sess, after=None, limit=PAGE_SIZE):
+    return _fetch(db_sess, job_summaries_query(after), limit, scalars=False)
+
+
+def stream_job_summaries():
+    return _stream(job_summaries_query(), scalars=False)
+
+
+def job_summaries_query(after=None):
+    # Всё, что показывает /jobs, считается в базе одним запросом:
+    # длительность, имя тимлида и список уровней опасности через подзапрос
+    job_levels = (sa.select(Category.level)
+                  .join(association_table, association_table.c.category == Category.id)
+                  .where(association_table.c.jobs == Jobs.id)
+                  .distinct()
+                  .order_by(Category.level)
+                  .correlate(Jobs)
+                  .subquery())
+    levels = sa.select(sa.func.aggregate_strings(sa.cast(job_levels.c.level, sa.String), ', ')).scalar_subquery()
+    query = (sa.select(Jobs.job.label('title'),
+                       (User.name + ' ' + User.surname).label('team_leader'),
+                       sa.cast(sa.func.round(hours_between(Jobs.start_date, Jobs.end_date)),
+                               sa.Integer).label('hours'),
+                       Jobs.collaborators,
+                       Jobs.is_finished,
+                       Jobs.team_leader.label('team_leader_id'),
+                       Jobs.id,
+                       levels.label('levels'))
+             .outerjoin(User, User.id == Jobs.team_leader))
+    if after is not None:
+        query = query.where(Jobs.id > after)
+    return query.order_by(Jobs.id)
+
+
+def departments_list(db_sess):
+    return db_sess.scalars(departments_query()).all()
+
+
+def departments_query():
+    return sa.select(Department).options(orm.joinedload(Department.user))
+
+
+def jobs_of_user(db_sess, user_id):
+    return db_sess.scalars(jobs_of_user_query(user_id)).all()
+
+
+def jobs_of_user_query(user_id):
+    # Поиск по индексу ix_job_collaborators_user_id, а не разбор строк Jobs.collaborators
+    return (sa.select(Jobs)
+            .join(job_collaborators, job_collaborators.c.job_id == Jobs.id)
+            .where(job_collaborators.c.user_id == user_id)
+            .order_by(Jobs.id))
+
+
+def departments_of_user(db_sess, user_id):
+    return db_sess.scalars(departments_of_user_query(user_id)).all()
+
+
+def departments_of_user_query(user_id):
+    return (sa.select(Department)
+            .join(department_members, department_members.c.department_id == Department.id)
+            .where(department_members.c.user_id == user_id)
+            .order_by(Department.id))
+
+
+async def fetch_async(db_sess, query, limit=PAGE_SIZE, scalars=True):
+    # То же для AsyncSession (см. asgi.py); потоковый режим там не нужен
+    if limit is not None:
+        query = query.limit(limit + 1)
+    result = await (db_sess.scalars(query) if scalars else db_sess.execute(query))
+    return result.all()
+
+
+def _fetch(db_sess, query, limit, scalars=True):
+    # Одна страница и ещё одна строка, чтобы понять, есть ли следующая
+    execute = db_sess.scalars if scalars else db_sess.execute
+    return execute(query.limit(limit + 1)).all()
+
+
+def _stream(query, scalars=True):
+    # Строки подгружаются пачками по мере рендеринга. stream_template читает их
+    # уже после teardown запроса, который закрывает сессию, поэтому сессия
+    # открывается здесь, внутри генератора; закроет её teardown в конце ответа
+    db_sess = db_session.create_session()
+    execute = db_sess.scalars if scalars else db_sess.execute
+    yield from execute(query.execution_options(yield_per=YIELD_PER))
+
+
+def split_page(rows, limit=PAGE_SIZE):
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1]
+    return rows, None
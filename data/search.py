@@ -0,0 +1,110 @@
+import re
+import sys
+
+import sqlalchemy as sa
+from markupsafe import Markup, escape
+from sqlalchemy import orm
+
+from . import db_session
+from .jobs import Jobs
+from .news import News
+from .queries import PAGE_SIZE, visible_news
+
+# Полнотекстовый поиск по новостям и работам на SQLite FTS5. Индексы news_fts
+# и jobs_fts создаёт миграция m0005 и поддерживают триггеры на исходных таблицах.
+# Если индекс разошёлся с данными (например, после ручной правки базы):
+#   python -m data.search rebuild db/blogs.db
+
+FTS_TABLES = {
+    'news_fts': ('news', ('title', 'content')),
+    'jobs_fts': ('jobs', ('job',)),
+}
+# Совпадения в snippet() помечаются управляющими символами, а не HTML,
+# чтобы сам текст можно было экранировать
+MARK_START, MARK_END = '\x02', '\x03'
+RANK_WINDOW = 10000
+
+news_fts = sa.table('news_fts', sa.column('rowid'), sa.column('title'), sa.column('content'))
+jobs_fts = sa.table('jobs_fts', sa.column('rowid'), sa.column('job'))
+
+
+def match_query(text):
+    # Пользовательский ввод -> запрос FTS5: все слова обязательны, каждое (кроме
+    # однобуквенных, для них нет префиксного индекса) ищется как префикс
+    words = re.findall(r'\w+', text or '')
+    return ' '.join('"{}"{}'.format(word.replace('"', '""'), '*' if len(word) > 1 else '')
+                    for word in words)
+
+
+def highlight(snippet):
+    return Markup(str(escape(snippet or '')).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+def search_news(db_sess, user, text, page=1, limit=PAGE_SIZE):
+    match = match_query(text)
+    if not match:
+        return [], False
+    query = (sa.select(News, _snippet(news_fts))
+             .join(news_fts, news_fts.c.rowid == News.id)
+             .options(orm.joinedload(News.user)))
+    # заголовок весит больше текста
+    query = _ranked(visible_news(query, user), news_fts, match, 10.0, 1.0)
+    return _page(db_sess, query, page, limit)
+
+
+def search_jobs(db_sess, text, page=1, limit=PAGE_SIZE):
+    match = match_query(text)
+    if not match:
+        return [], False
+    query = sa.select(Jobs, _snippet(jobs_fts)).join(jobs_fts, jobs_fts.c.rowid == Jobs.id)
+    return _page(db_sess, _ranked(query, jobs_fts, match), page, limit)
+
+
+def _snippet(fts):
+    return sa.func.snippet(sa.literal_column(fts.name), -1, MARK_START, MARK_END, '…', 16)
+
+
+def _ranked(query, fts, match, *weights):
+    # bm25 считается для каждого совпадения, и для слова, которое есть почти везде,
+    # это секунды на миллионе строк. Поэтому по рангу сортируются только RANK_WINDOW
+    # самых новых видимых совпадений (rowid растёт вместе с id записи), а более
+    # старые идут после них от новых к старым — до них можно долистать
+    matches = sa.literal_column(fts.name).op('MATCH')(match)
+    query = query.where(matches)
+    window_start = (query.with_only_columns(fts.c.rowid).order_by(fts.c.rowid.desc())
+                    .offset(RANK_WINDOW - 1).limit(1)
+                    .correlate(None).scalar_subquery())
+    in_window = fts.c.rowid >= sa.func.coalesce(window_start, 0)
+    return query.order_by(in_window.desc(),
+                          sa.case((in_window, sa.func.bm25(sa.literal_column(fts.name), *weights))),
+                          fts.c.rowid.desc())
+
+
+def _page(db_sess, query, page, limit):
+    # Порядок по рангу не годится для курсора, поэтому здесь обычный offset
+    rows = db_sess.execute(query.offset((page - 1) * limit).limit(limit + 1)).all()
+    return rows[:limit], len(rows) > limit
+
+
+def rebuild(conn):
+    for name in FTS_TABLES:
+        conn.exec_driver_sql(f"INSERT INTO {name}({name}) VALUES ('rebuild')")
+
+
+def optimize(conn):
+    for name in FTS_TABLES:
+        conn.exec_driver_sql(f"INSERT INTO {name}({name}) VALUES ('optimize')")
+
+
+def main(argv):
+    commands = {'rebuild': rebuild, 'optimize': optimize}
+    if len(argv) < 2 or argv[1] not in commands:
+        raise SystemExit('python -m data.search rebuild|optimize [db]')
+    db_file = argv[2] if len(argv) > 2 else 'db/blogs.db'
+    with db_session.create_engine(db_file).begin() as conn:
+        commands[argv[1]](conn)
+    print('Готово')
+
+
+if __name__ == '__main__':
+    main(sys.argv)
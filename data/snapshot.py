@@ -0,0 +1,25 @@
+import sys
+import time
+
+from . import db_session
+
+# Обновляет SQLite-реплику копией основной базы (см. DATABASE_REPLICAS в main.py):
+#   python -m data.snapshot db/blogs.db db/replica.db
+#   python -m data.snapshot db/blogs.db db/replica.db 30    — повторять каждые 30 с
+
+
+def main(argv):
+    if len(argv) < 3:
+        raise SystemExit('python -m data.snapshot <база> <реплика> [период, с]')
+    every = float(argv[3]) if len(argv) > 3 else None
+    while True:
+        started = time.perf_counter()
+        db_session.snapshot(argv[1], argv[2])
+        print(f'{argv[2]} обновлена за {time.perf_counter() - started:.2f} с')
+        if every is None:
+            return
+        time.sleep(every)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
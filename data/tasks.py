@@ -0,0 +1,294 @@
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from . import db_session, events, search
+from .page_cache import CACHED_MODELS, page_cache
+from .jobs import Jobs
+from .news import News
+
+# Фоновые задачи для побочных действий после commit, которые не должны
+# задерживать ответ. Задача — функция, зарегистрированная через @task;
+# ставится в очередь по имени с аргументами, которые можно сохранить в JSON.
+#   enqueue('replicas.refresh', key='replicas.refresh', delay=1)
+# key склеивает повторы: пока задача с таким ключом ждёт запуска, новые не ставятся.
+# Упавшая задача перезапускается через BACKOFF * 2 ** (попытка - 1) секунд,
+# после retries попыток — только запись в лог (а в SQLite-очереди строка с failed = 1).
+#
+# Очередь задаётся строкой (TASK_QUEUE в main.py), число потоков — отдельно:
+#   "thread"  — в памяти процесса
+#   "sqlite:/var/lib/mars/tasks.db" — в файле SQLite, переживает перезапуск;
+#               разбирают её потоки процесса и/или python -m data.tasks
+#   "inline"  — сразу в вызывающем потоке (скрипты, отладка)
+
+log = logging.getLogger(__name__)
+
+DEFAULT_RETRIES = 3
+BACKOFF = 2
+# Сколько секунд задача SQLite-очереди считается занятой воркером;
+# если он умер, её возьмёт другой
+LEASE = 300
+POLL_INTERVAL = 1
+# Задержки задач, поставленных после commit; повторы за это время склеиваются
+REPLICA_REFRESH_DELAY = 1
+SEARCH_OPTIMIZE_DELAY = 600
+
+_registry = {}
+
+
+class TaskFailed(Exception):
+    pass
+
+
+def task(name, retries=DEFAULT_RETRIES):
+    def decorator(func):
+        _registry[name] = (func, retries)
+        return func
+    return decorator
+
+
+def run(name, args, attempt):
+    # -> None, если задача выполнена, иначе через сколько секунд повторить;
+    # после последней попытки или для неизвестной задачи — исключение TaskFailed
+    if name not in _registry:
+        raise TaskFailed(f'Неизвестная задача {name}')
+    func, retries = _registry[name]
+    try:
+        func(*args)
+    except Exception as e:
+        if attempt >= retries:
+            log.exception('Задача %s не выполнена за %s попыток', name, attempt)
+            raise TaskFailed(repr(e)) from e
+        log.warning('Задача %s, попытка %s: ошибка, повтор', name, attempt, exc_info=True)
+        return BACKOFF * 2 ** (attempt - 1)
+    return None
+
+
+def run_in_worker(name, args, attempt):
+    # Сессия потока воркера закрывается после каждой задачи. InlineQueue так не делает:
+    # она работает в потоке запроса, прямо из after_commit, пока commit ещё не вернулся
+    try:
+        return run(name, args, attempt)
+    finally:
+        db_session.remove_session()
+
+
+class InlineQueue:
+    def put(self, name, args, key=None, delay=0):
+        attempt = 1
+        try:
+            while (retry_in := run(name, args, attempt)) is not None:
+                time.sleep(retry_in)
+                attempt += 1
+        except TaskFailed:
+            pass
+
+
+class ThreadQueue:
+    def __init__(self, workers=2):
+        self.workers = workers
+        self._heap = []
+        self._keys = set()
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+        self._pid = None
+
+    def put(self, name, args, key=None, delay=0):
+        with self._condition:
+            self._push(time.time() + delay, name, args, key, 1)
+            self._start()
+
+    def _push(self, run_at, name, args, key, attempt):
+        if key is not None:
+            if key in self._keys:
+                return
+            self._keys.add(key)
+        heapq.heappush(self._heap, (run_at, next(self._order), name, args, key, attempt))
+        self._condition.notify()
+
+    def _start(self):
+        # Потоки не переживают fork, поэтому в каждом процессе запускаются заново
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f'task-worker-{i}', daemon=True).start()
+
+    def _take(self):
+        with self._condition:
+            while not self._heap or self._heap[0][0] > time.time():
+                self._condition.wait(self._heap[0][0] - time.time() if self._heap else None)
+            run_at, _, name, args, key, attempt = heapq.heappop(self._heap)
+            self._keys.discard(key)
+            return name, args, key, attempt
+
+    def _work(self):
+        while True:
+            name, args, key, attempt = self._take()
+            try:
+                retry_in = run_in_worker(name, args, attempt)
+            except TaskFailed:
+                continue
+            if retry_in is not None:
+                with self._condition:
+                    self._push(time.time() + retry_in, name, args, key, attempt + 1)
+
+
+class SqliteQueue:
+    def __init__(self, path, workers=0):
+        self.path = path
+        self.workers = workers
+        self._local = threading.local()
+        self._pid = None
+        self._lock = threading.Lock()
+        # Повтор по ключу допустим, пока прежняя задача уже выполняется
+        self._connection().executescript(
+            'CREATE TABLE IF NOT EXISTS tasks (id INTEGER PRIMARY KEY, name TEXT NOT NULL, '
+            'args TEXT NOT NULL, key TEXT, run_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, '
+            'locked_until REAL NOT NULL DEFAULT 0, failed INTEGER NOT NULL DEFAULT 0, error TEXT);'
+            'CREATE UNIQUE INDEX IF NOT EXISTS ix_tasks_pending_key ON tasks (key) '
+            'WHERE key IS NOT NULL AND locked_until = 0 AND failed = 0;'
+            'CREATE INDEX IF NOT EXISTS ix_tasks_run_at ON tasks (run_at) WHERE failed = 0;')
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA busy_timeout=5000')
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def put(self, name, args, key=None, delay=0):
+        self._connection().execute('INSERT OR IGNORE INTO tasks (name, args, key, run_at) VALUES (?, ?, ?, ?)',
+                                   (name, json.dumps(list(args)), key, time.time() + delay))
+        with self._lock:
+            if self.workers and self._pid != os.getpid():
+                self._pid = os.getpid()
+                for i in range(self.workers):
+                    threading.Thread(target=self.work, name=f'task-worker-{i}', daemon=True).start()
+
+    def claim(self):
+        # Один оператор, поэтому одну задачу не возьмут два воркера,
+        # в том числе из разных процессов
+        now = time.time()
+        return self._connection().execute(
+            'UPDATE tasks SET locked_until = ?, attempts = attempts + 1 WHERE id = '
+            '(SELECT id FROM tasks WHERE failed = 0 AND run_at <= ? AND locked_until < ? ORDER BY run_at LIMIT 1) '
+            'RETURNING id, name, args, attempts', (now + LEASE, now, now)).fetchone()
+
+    def process(self, row):
+        task_id, name, args, attempt = row
+        connection = self._connection()
+        try:
+            retry_in = run_in_worker(name, json.loads(args), attempt)
+        except TaskFailed as e:
+            connection.execute('UPDATE tasks SET failed = 1, error = ? WHERE id = ?', (str(e), task_id))
+            return
+        if retry_in is None:
+            connection.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
+        else:
+            # OR REPLACE: если за это время поставили такую же задачу, остаётся одна
+            connection.execute('UPDATE OR REPLACE tasks SET run_at = ?, locked_until = 0 WHERE id = ?',
+                               (time.time() + retry_in, task_id))
+
+    def work(self, once=False):
+        while True:
+            row = self.claim()
+            if row is None:
+                if once:
+                    return
+                time.sleep(POLL_INTERVAL)
+                continue
+            self.process(row)
+
+
+def make_queue(url, workers=2):
+    kind, _, arg = (url or 'thread').partition(':')
+    if kind == 'inline':
+        return InlineQueue()
+    if kind == 'thread':
+        return ThreadQueue(workers)
+    if kind == 'sqlite':
+        return SqliteQueue(arg, workers)
+    raise ValueError(f'Неизвестная очередь задач: {url}')
+
+
+_queue = ThreadQueue()
+
+
+def configure(url, workers=2):
+    global _queue
+    _queue = make_queue(url, workers)
+
+
+def enqueue(name, *args, key=None, delay=0):
+    if name not in _registry:
+        raise ValueError(f'Неизвестная задача {name}')
+    _queue.put(name, args, key, delay)
+
+
+@task('replicas.refresh')
+def refresh_replicas():
+    primary = db_session.get_engine().url
+    for replica in db_session.get_replica_engines():
+        if primary.get_backend_name() == replica.url.get_backend_name() == 'sqlite':
+            db_session.snapshot(primary.database, replica.url.database)
+    # Страницы, собранные с реплики до снимка, могли попасть в кэш уже под новыми
+    # версиями таблиц (после commit, но до снимка) — сбрасываем их ещё раз
+    page_cache.invalidate(*(model.__tablename__ for model in CACHED_MODELS))
+
+
+@task('search.optimize')
+def optimize_search():
+    with db_session.get_engine().begin() as conn:
+        # Индекс поиска есть только в SQLite (см. m0005_search)
+        if conn.dialect.name == 'sqlite':
+            search.optimize(conn)
+
+
+@events.on_commit(db_session.SqlAlchemyBase)
+def _refresh_replicas_later(model, ids):
+    if db_session.get_replica_engines():
+        enqueue('replicas.refresh', key='replicas.refresh', delay=REPLICA_REFRESH_DELAY)
+
+
+@events.on_commit((News, Jobs))
+def _optimize_search_later(model, ids):
+    enqueue('search.optimize', key='search.optimize', delay=SEARCH_OPTIMIZE_DELAY)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m data.tasks',
+                                     description='Воркер SQLite-очереди фоновых задач')
+    parser.add_argument('db', help='основная база')
+    parser.add_argument('queue', help='файл очереди (как в TASK_QUEUE=sqlite:<файл>)')
+    parser.add_argument('--replica', action='append', default=[], help='реплика для replicas.refresh')
+    parser.add_argument('--page-cache', help='общий кэш страниц (как PAGE_CACHE у веб-процессов)')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--once', action='store_true', help='выполнить готовые задачи и выйти')
+    args = parser.parse_args(argv)
+
+    db_session.global_init(args.db, replicas=args.replica)
+    page_cache.configure(args.page_cache or 'off')
+    queue = SqliteQueue(args.queue)
+    if args.once:
+        queue.work(once=True)
+        return
+    workers = [threading.Thread(target=queue.work, name=f'task-worker-{i}', daemon=True)
+               for i in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,69 @@
+import sqlalchemy as sa
+
+from . import db_session, events
+from .cache import LRUCache
+from .users import User, UserPrincipal
+
+
+class UserDirectory:
+    # Справочник пользователей (id -> почта, имя) для выпадающих списков в формах
+    # и для current_user (см. UserPrincipal). Читает только нужные колонки,
+    # живёт ttl секунд и сбрасывается после commit, в котором менялись пользователи.
+    # Читается всегда из основной базы, чтобы не закэшировать отставшую реплику.
+
+    def __init__(self, ttl=300, maxsize=10000):
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def id_choices(self):
+        return self._listing()['ids']
+
+    def email_choices(self):
+        return self._listing()['emails']
+
+    def get(self, user_id):
+        principal = self._cache.get(('user', int(user_id)))
+        if principal is None:
+            with db_session.primary():
+                row = db_session.create_session().execute(self._principal_query(user_id)).first()
+            principal = self._remember(row)
+        return principal
+
+    async def get_async(self, user_id, db_sess):
+        principal = self._cache.get(('user', int(user_id)))
+        if principal is None:
+            row = (await db_sess.execute(self._principal_query(user_id))).first()
+            principal = self._remember(row)
+        return principal
+
+    def invalidate(self, model=None, ids=None):
+        self._cache.pop('listing')
+        if ids is None:
+            self._cache.clear()
+            return
+        for user_id in ids:
+            self._cache.pop(('user', user_id))
+
+    def _principal_query(self, user_id):
+        return sa.select(User.id, User.email, User.name, User.surname).where(User.id == int(user_id))
+
+    def _remember(self, row):
+        if row is None:
+            return None
+        principal = UserPrincipal(**row._asdict())
+        self._cache.set(('user', principal.id), principal)
+        return principal
+
+    def _listing(self):
+        listing = self._cache.get('listing')
+        if listing is None:
+            with db_session.primary():
+                rows = db_session.create_session().execute(
+                    sa.select(User.id, User.email).order_by(User.id)).all()
+            listing = {'ids': [str(row.id) for row in rows],
+                       'emails': [row.email for row in rows]}
+            self._cache.set('listing', listing)
+        return listing
+
+
+directory = UserDirectory()
+events.on_commit(User, directory.invalidate)
@@ -1,7 +1,7 @@
 import datetime
 import sqlalchemy
 from .db_session import SqlAlchemyBase
-from werkzeug.security import check_password_hash, generate_password_hash
+from . import passwords
 from flask_login import UserMixin
 
 
@@ -16,13 +16,31 @@ class User(SqlAlchemyBase, UserMixin):
     address = sqlalchemy.Column(sqlalchemy.String, nullable=True)
     email = sqlalchemy.Column(sqlalchemy.String, nullable=False, unique=True, index=True)
     hashed_password = sqlalchemy.Column(sqlalchemy.String, nullable=True)
-    modified_date = sqlalchemy.Column(sqlalchemy.DateTime, default=datetime.datetime.now)
+    modified_date = sqlalchemy.Column(sqlalchemy.DateTime, default=datetime.datetime.now,
+                                      onupdate=datetime.datetime.now, index=True)
 
     def __repr__(self):
         return f'<Colonist> {self.id} {self.surname} {self.name} {self.age} years'
 
     def set_password(self, password):
-        self.hashed_password = generate_password_hash(password)
+        self.hashed_password = passwords.hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.hashed_password, password)
+        return passwords.verify_password(self.hashed_password, password)
+
+    def password_needs_rehash(self):
+        return passwords.needs_rehash(self.hashed_password)
+
+
+class UserPrincipal(UserMixin):
+    # Лёгкая замена User для current_user: только то, что нужно шаблонам и
+    # проверкам владельца, без hashed_password и привязки к сессии
+
+    def __init__(self, id, email, name, surname):
+        self.id = id
+        self.email = email
+        self.name = name
+        self.surname = surname
+
+    def __repr__(self):
+        return f'<Principal> {self.id} {self.surname} {self.name}'
@@ -0,0 +1,119 @@
+import sqlalchemy as sa
+
+from . import events
+from .category import Category, association_table, category_ids
+from .departments import Department, department_members
+from .jobs import Jobs, job_collaborators
+from .queries import owned_by
+from .users import User
+
+# Изменения работ и департаментов одной транзакцией и минимальным числом
+# запросов: без предварительного SELECT, UPDATE/DELETE сразу с проверкой
+# владельца, связи при правке меняются разницей множеств (см. _sync_links). Функции сами делают commit
+# (или rollback и возвращают False, если записи нет или она чужая).
+# Запросы идут мимо ORM, поэтому об изменениях сообщается через events.touch.
+
+
+def chief_id(db_sess, email):
+    # users.email уникален и проиндексирован
+    return db_sess.scalar(sa.select(User.id).where(User.email == email))
+
+
+def create_job(db_sess, user, values, collaborator_ids, levels):
+    collaborator_ids = sorted(set(collaborator_ids))
+    result = db_sess.execute(sa.insert(Jobs.__table__).values(
+        team_leader=user.id, collaborators=_csv(collaborator_ids), **values))
+    job_id = result.inserted_primary_key[0]
+    _set_job_links(db_sess, job_id, collaborator_ids, levels, replace=False)
+    return _commit(db_sess, Jobs, job_id)
+
+
+def update_job(db_sess, job_id, user, values, collaborator_ids, levels):
+    collaborator_ids = sorted(set(collaborator_ids))
+    result = db_sess.execute(sa.update(Jobs.__table__)
+                             .where(Jobs.id == job_id, owned_by(Jobs.team_leader, user))
+                             .values(team_leader=user.id, collaborators=_csv(collaborator_ids), **values))
+    if result.rowcount != 1:
+        db_sess.rollback()
+        return False
+    _set_job_links(db_sess, job_id, collaborator_ids, levels)
+    return _commit(db_sess, Jobs, job_id)
+
+
+def delete_job(db_sess, job_id, user):
+    result = db_sess.execute(sa.delete(Jobs.__table__)
+                             .where(Jobs.id == job_id, owned_by(Jobs.team_leader, user)))
+    if result.rowcount != 1:
+        db_sess.rollback()
+        return False
+    db_sess.execute(job_collaborators.delete().where(job_collaborators.c.job_id == job_id))
+    db_sess.execute(association_table.delete().where(association_table.c.jobs == job_id))
+    return _commit(db_sess, Jobs, job_id)
+
+
+def create_department(db_sess, chief, values, member_ids):
+    member_ids = sorted(set(member_ids))
+    result = db_sess.execute(sa.insert(Department.__table__).values(
+        chief=chief, members=_csv(member_ids), **values))
+    department_id = result.inserted_primary_key[0]
+    _set_members(db_sess, department_id, member_ids, replace=False)
+    return _commit(db_sess, Department, department_id)
+
+
+def update_department(db_sess, department_id, user, chief, values, member_ids):
+    member_ids = sorted(set(member_ids))
+    result = db_sess.execute(sa.update(Department.__table__)
+                             .where(Department.id == department_id, owned_by(Department.chief, user))
+                             .values(chief=chief, members=_csv(member_ids), **values))
+    if result.rowcount != 1:
+        db_sess.rollback()
+        return False
+    _set_members(db_sess, department_id, member_ids)
+    return _commit(db_sess, Department, department_id)
+
+
+def delete_department(db_sess, department_id, user):
+    result = db_sess.execute(sa.delete(Department.__table__)
+                             .where(Department.id == department_id, owned_by(Department.chief, user)))
+    if result.rowcount != 1:
+        db_sess.rollback()
+        return False
+    db_sess.execute(department_members.delete().where(department_members.c.department_id == department_id))
+    return _commit(db_sess, Department, department_id)
+
+
+def _set_job_links(db_sess, job_id, collaborator_ids, levels, replace=True):
+    categories = sorted(category_ids(db_sess, levels).values())
+    _sync_links(db_sess, job_collaborators.c.job_id, job_id, job_collaborators.c.user_id, User.id,
+                collaborator_ids, replace)
+    _sync_links(db_sess, association_table.c.jobs, job_id, association_table.c.category, Category.id,
+                categories, replace)
+
+
+def _set_members(db_sess, department_id, member_ids, replace=True):
+    _sync_links(db_sess, department_members.c.department_id, department_id,
+                department_members.c.user_id, User.id, member_ids, replace)
+
+
+def _sync_links(db_sess, owner, owner_id, link, target, ids, replace=True):
+    # Разница множеств считается в базе: DELETE только убранных связей и
+    # INSERT ... SELECT только новых (id берутся из таблицы, на которую ссылается
+    # связь, так что несуществующие отбрасываются). Два запроса при любом числе связей,
+    # у новой записи (replace=False) удалять нечего — только INSERT
+    if replace:
+        db_sess.execute(owner.table.delete().where(owner == owner_id, link.not_in(ids)))
+    if ids:
+        new_links = sa.select(sa.literal(owner_id), target).where(target.in_(ids))
+        if replace:
+            new_links = new_links.where(~sa.select(link).where(owner == owner_id, link == target).exists())
+        db_sess.execute(owner.table.insert().from_select([owner, link], new_links))
+
+
+def _commit(db_sess, model, object_id):
+    events.touch(db_sess, model, [object_id])
+    db_sess.commit()
+    return object_id
+
+
+def _csv(ids):
+    return ','.join(str(i) for i in ids)
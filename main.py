@@ -1,18 +1,22 @@
 import datetime
+import os
+import time
 
-from flask import Flask, render_template, redirect, request, abort
+from flask import Flask, render_template, redirect, request, abort, stream_template, session
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_wtf import FlaskForm
 from wtforms import EmailField, PasswordField, SubmitField, BooleanField, StringField, IntegerField, \
     DateTimeField, TextAreaField, SelectField, SelectMultipleField
 from wtforms.validators import DataRequired
 
-from data import db_session
+from api import api
+from data import db_session, instrumentation, passwords, queries, search, tasks, writes
 from data.departments import Department
 from data.jobs import Jobs
 from data.news import News
 from data.users import User
-from data.category import Category
+from data.user_directory import directory as user_directory
+from data.page_cache import page_cache
 
 
 class LoginForm(FlaskForm):
@@ -66,14 +70,62 @@ class DepartmentForm(FlaskForm):
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'yandexlyceum_secret_key'
+app.config['STREAM_LISTS'] = False
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 0)) or None
+passwords.configure(method=app.config['PASSWORD_HASH_METHOD'],
+                    workers=app.config['PASSWORD_HASH_WORKERS'])
+app.config['PAGE_CACHE'] = os.environ.get('PAGE_CACHE', 'memory')
+page_cache.configure(app.config['PAGE_CACHE'])
+# Побочные действия после commit (обновление реплик, слияние индекса поиска), см. data/tasks.py
+app.config['TASK_QUEUE'] = os.environ.get('TASK_QUEUE', 'thread')
+app.config['TASK_WORKERS'] = int(os.environ.get('TASK_WORKERS', 2))
+tasks.configure(app.config['TASK_QUEUE'], app.config['TASK_WORKERS'])
+app.config['DATABASE_REPLICAS'] = [url for url in os.environ.get('DATABASE_REPLICAS', '').split(',') if url]
+# Сколько секунд после своей записи пользователь читает из основной базы
+app.config['READ_YOUR_WRITES_SECONDS'] = int(os.environ.get('READ_YOUR_WRITES_SECONDS', 10))
+app.config['INSTRUMENTATION'] = bool(os.environ.get('INSTRUMENTATION'))
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR')
+app.jinja_env.filters['highlight'] = search.highlight
+app.register_blueprint(api)
 login_manager = LoginManager()
 login_manager.init_app(app)
+if app.config['INSTRUMENTATION']:
+    instrumentation.init_app(app, profile_dir=app.config['PROFILE_DIR'])
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    db_sess = db_session.create_session()
-    return db_sess.query(User).get(user_id)
+    return user_directory.get(user_id)
+
+
+@app.before_request
+def route_reads():
+    # Отправка формы (вход, регистрация, правка) проверяет данные перед записью —
+    # такие проверки читают основную базу, реплика может ещё не знать о чужой записи
+    db_session.start_request(read_primary=request.method not in ('GET', 'HEAD')
+                             or session.get('_primary_until', 0) > time.time())
+
+
+@app.after_request
+def remember_writes(response):
+    if db_session.wrote():
+        session['_primary_until'] = time.time() + app.config['READ_YOUR_WRITES_SECONDS']
+    return response
+
+
+@app.teardown_appcontext
+def shutdown_session(exception=None):
+    db_session.remove_session()
+    stats = db_session.stats()
+    if stats['sessions'] or stats['connections']:
+        app.logger.warning('После запроса остались открытые сессии (%(sessions)s) '
+                           'и соединения (%(connections)s)', stats)
+
+
+@app.errorhandler(passwords.PasswordPoolBusy)
+def password_pool_busy(error):
+    return 'Слишком много входов одновременно, попробуйте ещё раз', 503, {'Retry-After': '1'}
 
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -83,6 +135,9 @@ def login():
         db_sess = db_session.create_session()
         user = db_sess.query(User).filter(User.email == form.email.data).first()
         if user and user.check_password(form.password.data):
+            if user.password_needs_rehash():
+                user.set_password(form.password.data)
+                db_sess.commit()
             login_user(user, remember=form.remember_me.data)
             return redirect("/")
         return render_template('login.html',
@@ -98,33 +153,52 @@ def logout():
     return redirect("/")
 
 
+def _streaming():
+    return request.args.get('stream', app.config['STREAM_LISTS'], type=int)
+
+
 @app.route('/')
 @app.route('/index')
+@page_cache.cached('news', 'users')
 def base():
+    if _streaming():
+        return stream_template('common.html', news=queries.stream_news_feed(current_user))
+    after = request.args.get('after')
+    if after:
+        try:
+            after = queries.parse_news_cursor(after)
+        except ValueError:
+            abort(400)
     db_sess = db_session.create_session()
-    if current_user.is_authenticated:
-        news = db_sess.query(News).filter(
-            (News.user == current_user) | (News.is_private != True))
-    else:
-        news = db_sess.query(News).filter(News.is_private != True)
-    return render_template('common.html', news=news)
+    news, last = queries.split_page(queries.news_feed(db_sess, current_user, after=after))
+    return render_template('common.html', news=news,
+                           next_after=queries.news_cursor(last) if last else None)
 
 
 @app.route('/jobs')
+@page_cache.cached('jobs', 'category', 'users')
 def list_jobs():
+    if _streaming():
+        return stream_template('jobs.html', jobs=queries.stream_job_summaries())
     db_sess = db_session.create_session()
-    res = db_sess.query(Jobs).all()
-    data = []
-    for job in res:
-        title = job.job
-        time = f'{round((job.end_date - job.start_date).total_seconds() / 3600)} hours'
-        team_leader = job.user.name + ' ' + job.user.surname
-        collab = job.collaborators
-        f = job.is_finished
-        cats = list(map(str, {i.level for i in job.categories}))
-        lvl = ", ".join(cats) if len(job.categories) else None
-        data.append([title, team_leader, time, collab, f, job.user.id, job.id, lvl])
-    return render_template('jobs.html', jobs=data)
+    jobs, last = queries.split_page(queries.job_summaries(db_sess, after=request.args.get('after', type=int)))
+    return render_template('jobs.html', jobs=jobs, next_after=last.id if last else None)
+
+
+@app.route('/search')
+@page_cache.cached('news', 'jobs', 'users')
+def search_results():
+    text = request.args.get('q', '').strip()
+    what = request.args.get('what', 'news')
+    page = max(request.args.get('page', 1, type=int), 1)
+    db_sess = db_session.create_session()
+    if what == 'jobs':
+        results, has_next = search.search_jobs(db_sess, text, page)
+    else:
+        what = 'news'
+        results, has_next = search.search_news(db_sess, current_user, text, page)
+    return render_template('search.html', title='Поиск', q=text, what=what,
+                           results=results, page=page, has_next=has_next)
 
 
 @app.route('/register', methods=['GET', 'POST'])
@@ -160,27 +234,10 @@ def reqister():
 @login_required
 def addjob():
     form = JobForm()
-    _tmp = db_session.create_session()
-    _res = _tmp.query(User).all()
-    for _i in _res:
-        # form.email.choices.append(_i.email)
-        form.collab.choices.append(str(_i.id))
+    form.collab.choices = user_directory.id_choices()
     if form.validate_on_submit():
-        db_sess = db_session.create_session()
-        job = Jobs()
-        job.job = form.name.data
-        job.team_leader = current_user.id
-        job.collaborators = ','.join(form.collab.data)
-        job.is_finished = form.done.data
-        job.start_date = form.start_date.data
-        job.end_date = form.end_date.data
-        job.work_size = form.w_size.data
-        for i in list(map(int, form.hazard_level.data)):
-            cat = Category()
-            cat.level = i
-            job.categories.append(cat)
-        db_sess.add(job)
-        db_sess.commit()
+        writes.create_job(db_session.create_session(), current_user, _job_values(form),
+                          map(int, form.collab.data), map(int, form.hazard_level.data))
         """return render_template('job_add.html',
                                        message="Неправильный адрес почты тимлида",
                                        form=form)"""
@@ -188,59 +245,42 @@ def addjob():
     return render_template('job_add.html', title='Добавление работы', form=form)
 
 
+def _job_values(form):
+    return {'job': form.name.data, 'work_size': form.w_size.data, 'is_finished': form.done.data,
+            'start_date': form.start_date.data, 'end_date': form.end_date.data}
+
+
 @app.route('/addjob/<int:id>', methods=['GET', 'POST'])
 @login_required
+@db_session.primary()
 def edit_jobs(id):
     form = JobForm()
-    _tmp = db_session.create_session()
-    _res = _tmp.query(User).all()
-    for _i in _res:
-        # form.email.choices.append(_i.email)
-        form.collab.choices.append(str(_i.id))
+    form.collab.choices = user_directory.id_choices()
+    db_sess = db_session.create_session()
     if request.method == "GET":
-        db_sess = db_session.create_session()
         job = db_sess.query(Jobs).filter((Jobs.id == id),
-                                         ((Jobs.user == current_user) | (current_user.id == 1))
+                                         queries.owned_by(Jobs.team_leader, current_user)
                                          ).first()
         if job:
             form.name.data = job.job
             form.w_size.data = job.work_size
-            # form.collab.data = job.collaborators
+            form.collab.data = [str(user.id) for user in job.collaborator_users]
             form.start_date.data = job.start_date
             form.end_date.data = job.end_date
             # form.email.data = job.user.email
             form.done.data = job.is_finished
-            """if len(job.categories):
-                form.hazard_level.data = ", ".join([i.level for i in job.categories])
-            else:
-                form.hazard_level.data = None"""
+            form.hazard_level.data = [str(i.level) for i in job.categories]
         else:
             abort(404)
     if form.validate_on_submit():
-        db_sess = db_session.create_session()
-        job = db_sess.query(Jobs).filter((Jobs.id == id),
-                                         ((Jobs.user == current_user) | (current_user.id == 1))
-                                         ).first()
         """user = db_sess.query(User).filter(User.email == form.email.data).first()
         if not user:
             return render_template('job_add.html', title='Редактирование работы',
                                    message='Неверно указана почта тимлида', form=form)"""
-        if job:
-            job.job = form.name.data
-            job.team_leader = current_user.id
-            job.collaborators = ','.join(form.collab.data)
-            job.is_finished = form.done.data
-            job.start_date = form.start_date.data
-            job.end_date = form.end_date.data
-            job.work_size = form.w_size.data
-            for i in list(map(int, form.hazard_level.data)):
-                cat = Category()
-                cat.level = i
-                job.categories.append(cat)
-            db_sess.commit()
+        if writes.update_job(db_sess, id, current_user, _job_values(form),
+                             map(int, form.collab.data), map(int, form.hazard_level.data)):
             return redirect('/jobs')
-        else:
-            abort(404)
+        abort(404)
     return render_template('job_add.html',
                            title='Редактирование работы',
                            form=form
@@ -249,15 +289,9 @@ def edit_jobs(id):
 
 @app.route('/job_delete/<int:id>', methods=['GET', 'POST'])
 @login_required
+@db_session.primary()
 def jobs_delete(id):
-    db_sess = db_session.create_session()
-    jobs = db_sess.query(Jobs).filter((Jobs.id == id),
-                                      ((Jobs.user == current_user) | (current_user.id == 1))
-                                      ).first()
-    if jobs:
-        db_sess.delete(jobs)
-        db_sess.commit()
-    else:
+    if not writes.delete_job(db_session.create_session(), id, current_user):
         abort(404)
     return redirect('/jobs')
 
@@ -283,12 +317,13 @@ def add_news():
 
 @app.route('/news/<int:id>', methods=['GET', 'POST'])
 @login_required
+@db_session.primary()
 def edit_news(id):
     form = NewsForm()
     if request.method == "GET":
         db_sess = db_session.create_session()
         news = db_sess.query(News).filter((News.id == id),
-                                          ((News.user == current_user) | (current_user.id == 1))
+                                          queries.owned_by(News.user_id, current_user)
                                           ).first()
         if news:
             form.title.data = news.title
@@ -299,7 +334,7 @@ def edit_news(id):
     if form.validate_on_submit():
         db_sess = db_session.create_session()
         news = db_sess.query(News).filter((News.id == id),
-                                          ((News.user == current_user) | (current_user.id == 1))
+                                          queries.owned_by(News.user_id, current_user)
                                           ).first()
         if news:
             news.title = form.title.data
@@ -317,10 +352,11 @@ def edit_news(id):
 
 @app.route('/news_delete/<int:id>', methods=['GET', 'POST'])
 @login_required
+@db_session.primary()
 def news_delete(id):
     db_sess = db_session.create_session()
     news = db_sess.query(News).filter((News.id == id),
-                                      ((News.user == current_user) | (current_user.id == 1))
+                                      queries.owned_by(News.user_id, current_user)
                                       ).first()
     if news:
         db_sess.delete(news)
@@ -334,22 +370,13 @@ def news_delete(id):
 @login_required
 def add_depart():
     form = DepartmentForm()
-    _tmp = db_session.create_session()
-    _res = _tmp.query(User).all()
-    for _i in _res:
-        form.email.choices.append(_i.email)
-        form.members.choices.append(str(_i.id))
+    form.email.choices = user_directory.email_choices()
+    form.members.choices = user_directory.id_choices()
     if form.validate_on_submit():
         db_sess = db_session.create_session()
-        depart = Department()
-        depart.title = form.title.data
-        depart.members = ','.join(form.members.data)
-        depart.email = form.email_dep.data
-        res = db_sess.query(User).filter(User.email == form.email.data).first()
-        if res:
-            depart.chief = res.id
-            db_sess.add(depart)
-            db_sess.commit()
+        chief_id = writes.chief_id(db_sess, form.email.data)
+        if chief_id:
+            writes.create_department(db_sess, chief_id, _department_values(form), map(int, form.members.data))
             return redirect('/departments')
         return render_template('add_depart.html', title='Add a department',
                                form=form, message='Нет пользователя с таким email')
@@ -357,65 +384,55 @@ def add_depart():
                            form=form)
 
 
+def _department_values(form):
+    return {'title': form.title.data, 'email': form.email_dep.data}
+
+
 @app.route('/departments/<int:id>', methods=['GET', 'POST'])
 @login_required
+@db_session.primary()
 def edit_depart(id):
     form = DepartmentForm()
-    _tmp = db_session.create_session()
-    _res = _tmp.query(User).all()
-    for _i in _res:
-        form.email.choices.append(_i.email)
-        form.members.choices.append(str(_i.id))
+    form.email.choices = user_directory.email_choices()
+    form.members.choices = user_directory.id_choices()
+    db_sess = db_session.create_session()
     if request.method == "GET":
-        db_sess = db_session.create_session()
         depart = db_sess.query(Department).filter((Department.id == id),
-                                                  ((Department.user == current_user) | (current_user.id == 1))).first()
+                                                  queries.owned_by(Department.chief, current_user)).first()
         if depart:
             form.title.data = depart.title
-            # form.members.data = ', '.join(depart.members)
+            form.members.data = [str(user.id) for user in depart.member_users]
             form.email_dep.data = depart.email
             form.email.data = depart.user.email
         else:
             abort(404)
     if form.validate_on_submit():
-        db_sess = db_session.create_session()
-        depart = db_sess.query(Department).filter((Department.id == id),
-                                                  ((Department.user == current_user) | (current_user.id == 1))).first()
-        if depart:
-            depart.title = form.title.data
-            depart.members = ','.join(form.members.data)
-            depart.email = form.email_dep.data
-            res = db_sess.query(User).filter(User.email == form.email.data).first()
-            if res:
-                depart.chief = res.id
-                db_sess.add(depart)
-                db_sess.commit()
-                return redirect('/departments')
-            abort(404)
+        chief_id = writes.chief_id(db_sess, form.email.data)
+        if chief_id and writes.update_department(db_sess, id, current_user, chief_id,
+                                                 _department_values(form), map(int, form.members.data)):
+            return redirect('/departments')
+        abort(404)
     return render_template('add_depart.html', title='Department\'s editing', form=form)
 
 
 @app.route('/depart_delete/<int:id>', methods=['GET', 'POST'])
 @login_required
+@db_session.primary()
 def depart_delete(id):
-    db_sess = db_session.create_session()
-    depart = db_sess.query(Department).filter((Department.id == id),
-                                              ((Department.user == current_user) | (current_user.id == 1))).first()
-    if depart:
-        db_sess.delete(depart)
-        db_sess.commit()
-    else:
+    if not writes.delete_department(db_session.create_session(), id, current_user):
         abort(404)
     return redirect('/departments')
 
 
 @app.route('/departments')
+@page_cache.cached('departments', 'users')
 def list_departs():
     db_sess = db_session.create_session()
-    res = db_sess.query(Department).all()
+    res = queries.departments_list(db_sess)
     return render_template('departments.html', departs=res)
 
 
 if __name__ == '__main__':
-    db_session.global_init('db/blogs.db')
+    db_session.global_init(os.environ.get('DATABASE_URL', 'db/blogs.db'),
+                           replicas=app.config['DATABASE_REPLICAS'])
     app.run(port=8080, host='127.0.0.1')
@@ -0,0 +1,76 @@
+import itertools
+import os
+import shutil
+import sys
+
+import pytest
+import sqlalchemy as sa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data import db_session, tasks
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Одна копия db/blogs.db на весь прогон: global_init настраивается один раз на процесс.
+# Тесты, которые пишут в базу, создают свои строки и не рассчитывают на чужие.
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    db_file = str(tmp_path_factory.mktemp('db') / 'blogs.db')
+    shutil.copy(os.path.join(ROOT, 'db', 'blogs.db'), db_file)
+    db_session.global_init(db_file)
+    import main
+    main.app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    main.page_cache.configure('off')
+    tasks.configure('inline')
+    return main.app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def statements(app):
+    # SQL, отправленный в базу за время теста; statements.clear() — начать счёт заново
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    engine = db_session.get_engine()
+    sa.event.listen(engine, 'before_cursor_execute', record)
+    yield executed
+    sa.event.remove(engine, 'before_cursor_execute', record)
+
+
+_user_numbers = itertools.count(1)
+
+
+@pytest.fixture
+def make_user(app):
+    # Новый пользователь с паролем "pass"; email уникален в пределах прогона
+    from data.users import User
+
+    def make(name='Test'):
+        db_sess = db_session.create_session()
+        user = User(name=name, surname='Test', email=f'{name.lower()}{next(_user_numbers)}@test.org')
+        user.set_password('pass')
+        db_sess.add(user)
+        db_sess.commit()
+        user_id, email = user.id, user.email
+        db_session.remove_session()
+        return user_id, email
+    return make
+
+
+@pytest.fixture
+def login(client):
+    def log_in(email='scott_chief@mars.org', password='123'):
+        response = client.post('/login', data={'email': email, 'password': password})
+        assert response.status_code == 302
+        return response
+    return log_in
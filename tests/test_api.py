@@ -0,0 +1,39 @@
+from data import db_session
+from data.news import News
+
+
+def _add_news(user_id, is_private):
+    db_sess = db_session.create_session()
+    db_sess.add(News(title='etag', content='etag', user_id=user_id, is_private=is_private))
+    db_sess.commit()
+    db_session.remove_session()
+
+
+def test_news_etag_follows_visible_rows(app, client, make_user, login):
+    author, email = make_user()
+    stranger, _ = make_user()
+    guest = app.test_client()
+    login(email, 'pass')
+
+    def etags():
+        return guest.get('/api/v1/news').headers['ETag'], client.get('/api/v1/news').headers['ETag']
+
+    guest_etag, author_etag = etags()
+    _add_news(stranger, is_private=True)
+    assert etags() == (guest_etag, author_etag)
+
+    _add_news(author, is_private=True)
+    new_guest_etag, new_author_etag = etags()
+    assert new_guest_etag == guest_etag and new_author_etag != author_etag
+
+    _add_news(stranger, is_private=False)
+    assert all(new != old for new, old in zip(etags(), (new_guest_etag, new_author_etag)))
+
+
+def test_unchanged_news_is_one_query(client, make_user, login, statements):
+    login(make_user()[1], 'pass')
+    response = client.get('/api/v1/news?fields=id&limit=1000')
+    statements.clear()
+    assert client.get('/api/v1/news?fields=id&limit=1000',
+                      headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+    assert len(statements) == 1
@@ -0,0 +1,50 @@
+import sqlite3
+
+import sqlalchemy as sa
+
+from data import category, db_session
+from data.category import Category, category_ids
+
+
+def _level_rows(level):
+    db_sess = db_session.create_session()
+    try:
+        return db_sess.scalars(sa.select(Category.id).where(Category.level == level)).all()
+    finally:
+        db_session.remove_session()
+
+
+def test_rolled_back_level_is_not_cached(app):
+    db_sess = db_session.create_session()
+    category_ids(db_sess, [101])
+    db_sess.rollback()
+    assert 101 not in category._category_ids
+    assert _level_rows(101) == []
+
+    level_id = category_ids(db_sess, [101])[101]
+    db_sess.commit()
+    db_session.remove_session()
+    assert category._category_ids[101] == level_id
+    assert _level_rows(101) == [level_id]
+
+
+def test_level_added_concurrently_is_reused(app):
+    # Другой воркер успевает добавить тот же уровень между нашим SELECT и INSERT
+    engine = db_session.get_engine()
+
+    def insert_first(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT INTO category'):
+            other = sqlite3.connect(engine.url.database)
+            other.execute('INSERT INTO category (level) VALUES (102)')
+            other.commit()
+            other.close()
+
+    sa.event.listen(engine, 'before_cursor_execute', insert_first)
+    try:
+        db_sess = db_session.create_session()
+        level_id = category_ids(db_sess, [102])[102]
+        db_sess.commit()
+        db_session.remove_session()
+    finally:
+        sa.event.remove(engine, 'before_cursor_execute', insert_first)
+    assert _level_rows(102) == [level_id]
@@ -0,0 +1,67 @@
+import datetime
+
+import pytest
+import sqlalchemy as sa
+
+from data import db_session, tasks, writes
+from data.news import News
+from data.users import UserPrincipal
+
+# Списки собираются фиксированным числом запросов: новые записи, авторы
+# и связи не добавляют ни одного (нет N+1 на user, collaborators, members).
+
+PAGES = ('/', '/jobs', '/departments')
+
+
+@pytest.fixture
+def more_rows(app, make_user, monkeypatch):
+    # Строки живут до конца теста: база общая, а другие тесты считают записи в ленте
+    monkeypatch.setattr(tasks, '_queue', tasks.ThreadQueue(workers=0))
+    added = []
+
+    def add():
+        users = [UserPrincipal(user_id, email, 'Test', 'Test') for user_id, email in (make_user(), make_user())]
+        ids = [user.id for user in users]
+        db_sess = db_session.create_session()
+        for user in users:
+            # лента идёт от старых записей, задним числом новые попадут на первую страницу
+            news = [News(title='list', content='list', user_id=user.id, is_private=is_private,
+                         created_date=datetime.datetime(2000, 1, 1)) for is_private in (False, True)]
+            db_sess.add_all(news)
+            db_sess.commit()
+            job_id = writes.create_job(db_sess, user, {'job': 'list', 'work_size': 1, 'is_finished': False,
+                                                       'start_date': datetime.datetime(2023, 1, 1)}, ids, [1, 2])
+            department_id = writes.create_department(db_sess, user.id, {'title': 'list', 'email': 'list@test.org'},
+                                                     ids)
+            added.append((user, [item.id for item in news], job_id, department_id))
+        db_session.remove_session()
+
+    yield add
+    db_sess = db_session.create_session()
+    for user, news_ids, job_id, department_id in added:
+        db_sess.execute(sa.delete(News).where(News.id.in_(news_ids)))
+        db_sess.commit()
+        writes.delete_job(db_sess, job_id, user)
+        writes.delete_department(db_sess, department_id, user)
+    db_session.remove_session()
+
+
+def _count(client, statements, path, stream):
+    statements.clear()
+    response = client.get(path, query_string={'stream': stream})
+    assert response.status_code == 200
+    response.get_data()  # потоковое тело читает базу, пока его отдают
+    return len(statements)
+
+
+@pytest.mark.parametrize('stream', (0, 1))
+@pytest.mark.parametrize('path', PAGES)
+@pytest.mark.parametrize('logged_in', (False, True))
+def test_list_pages_run_constant_statements(client, make_user, login, more_rows, statements,
+                                            path, stream, logged_in):
+    if logged_in:
+        login(make_user()[1], 'pass')
+    _count(client, statements, path, stream)  # прогрев кэшей процесса
+    before = _count(client, statements, path, stream)
+    more_rows()
+    assert _count(client, statements, path, stream) == before
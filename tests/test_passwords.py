@@ -0,0 +1,36 @@
+import threading
+import time
+
+import pytest
+
+from data import passwords
+
+
+@pytest.fixture
+def small_pool(monkeypatch):
+    monkeypatch.setattr(passwords, '_settings', dict(passwords._settings))
+    passwords.configure(workers=1, queue_size=1)
+    yield
+    monkeypatch.undo()
+    passwords.configure()
+
+
+def test_full_pool_fails_fast(small_pool):
+    release, started = threading.Event(), threading.Event()
+
+    def hold():
+        started.set()
+        release.wait()
+
+    holder = threading.Thread(target=passwords._run, args=(hold,))
+    holder.start()
+    started.wait()
+    try:
+        start = time.monotonic()
+        with pytest.raises(passwords.PasswordPoolBusy):
+            passwords.hash_password('secret')
+        assert time.monotonic() - start < 1
+    finally:
+        release.set()
+        holder.join()
+    assert passwords.verify_password(passwords.hash_password('secret'), 'secret')
@@ -0,0 +1,27 @@
+import pytest
+
+from benchmarks import query_plans
+from data import db_session
+
+# Лента и проверки владельца идут по индексам (см. benchmarks/query_plans.py)
+
+
+@pytest.fixture(scope='module')
+def conn(app, tmp_path_factory):
+    # В тестовой базе по две-три строки, и по статистике ANALYZE полный просмотр честно
+    # дешевле. Без статистики SQLite считает таблицы большими — такие и проверяем
+    db_file = str(tmp_path_factory.mktemp('plans') / 'plans.db')
+    db_session.snapshot(db_session.get_engine().url.database, db_file)
+    engine = db_session.create_engine(db_file)
+    with engine.connect() as conn:
+        conn.exec_driver_sql('DELETE FROM sqlite_stat1')
+        conn.exec_driver_sql('ANALYZE sqlite_schema')
+        conn.commit()
+        yield conn
+    engine.dispose()
+
+
+@pytest.mark.parametrize('name', list(query_plans.checked_queries()))
+def test_no_full_scans(conn, name):
+    plan = query_plans.explain(conn, query_plans.checked_queries()[name])
+    assert query_plans.full_scans(plan) == [], plan
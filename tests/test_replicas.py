@@ -0,0 +1,110 @@
+import pytest
+import sqlalchemy as sa
+
+from data import db_session, tasks
+from data.news import News
+
+REGISTER = {'email': 'lag@test.org', 'password': 'p', 'password_again': 'p', 'surname': 's', 'name': 'n',
+            'age': 30, 'position': 'p', 'speciality': 's', 'address': 'a'}
+
+
+def _snapshot_engine(tmp_path, name):
+    # Снимок базы, который не обновляется: как реплика, отставшая от основной
+    replica_file = str(tmp_path / name)
+    db_session.snapshot(db_session.get_engine().url.database, replica_file)
+    return db_session.create_engine(replica_file)
+
+
+@pytest.fixture
+def replicas(app, monkeypatch):
+    monkeypatch.setattr(tasks, '_queue', tasks.ThreadQueue(workers=0))
+    registered = db_session.get_replica_engines()
+    added = []
+
+    def add(engine):
+        registered.append(engine)
+        added.append(engine)
+        return engine
+    yield add
+    for engine in added:
+        registered.remove(engine)
+        engine.dispose()
+
+
+@pytest.fixture
+def lagging_replica(replicas, tmp_path):
+    return replicas(_snapshot_engine(tmp_path, 'replica.db'))
+
+
+@pytest.fixture
+def executed_on():
+    # SQL по движкам: executed_on(engine) -> список, который пополняется до конца теста
+    listeners = []
+
+    def listen(engine):
+        executed = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            executed.append(statement)
+        sa.event.listen(engine, 'before_cursor_execute', record)
+        listeners.append((engine, record))
+        return executed
+    yield listen
+    for engine, record in listeners:
+        sa.event.remove(engine, 'before_cursor_execute', record)
+
+
+def test_register_checks_email_on_primary(app, lagging_replica):
+    assert app.test_client().post('/register', data=REGISTER).status_code == 302
+    # Второй клиент без "липкости" к основной базе: реплика этого email ещё не знает
+    response = app.test_client().post('/register', data=REGISTER)
+    assert response.status_code == 200
+    assert 'Такой пользователь уже есть' in response.get_data(as_text=True)
+
+
+def test_plain_reads_go_to_replica(app, lagging_replica, statements, executed_on):
+    replica_statements = executed_on(lagging_replica)
+    assert app.test_client().get('/departments').status_code == 200
+    assert replica_statements and not statements
+
+
+def test_session_reads_from_one_replica(app, replicas, tmp_path, executed_on):
+    engines = [replicas(_snapshot_engine(tmp_path, f'replica{i}.db')) for i in range(4)]
+    executed = [executed_on(engine) for engine in engines]
+    for _ in range(5):
+        db_sess = db_session.create_session()
+        for _ in range(10):
+            db_sess.scalar(sa.select(sa.func.count(News.id)))
+        db_session.remove_session()
+        assert sorted(len(statements) for statements in executed) == [0, 0, 0, 10]
+        for statements in executed:
+            statements.clear()
+
+
+def test_delete_link_finds_fresh_row_on_primary(app, lagging_replica, make_user):
+    _, email = make_user()
+    writer, other_tab = app.test_client(), app.test_client()
+    for client in (writer, other_tab):
+        assert client.post('/login', data={'email': email, 'password': 'pass'}).status_code == 302
+    assert writer.post('/news', data={'title': 'fresh', 'content': 'c'}).status_code == 302
+    with db_session.primary():
+        news_id = db_session.create_session().scalar(sa.select(sa.func.max(News.id)))
+    db_session.remove_session()
+    # Вторая вкладка не писала сама, но удаление должно найти запись, которой нет на реплике
+    assert other_tab.get(f'/news_delete/{news_id}').status_code == 302
+
+
+def test_page_cached_from_lagging_replica_is_dropped_after_refresh(app, lagging_replica, make_user):
+    from data.page_cache import page_cache
+    page_cache.configure('memory')
+    try:
+        _, email = make_user()
+        writer, guest = app.test_client(), app.test_client()
+        writer.post('/login', data={'email': email, 'password': 'pass'})
+        assert writer.post('/news', data={'title': 'after-lag', 'content': 'c'}).status_code == 302
+        # Кэш уже сброшен commit'ом, а реплика ещё старая: страница без новой записи
+        assert 'after-lag' not in guest.get('/').get_data(as_text=True)
+        tasks.refresh_replicas()
+        assert 'after-lag' in guest.get('/').get_data(as_text=True)
+    finally:
+        page_cache.configure('off')
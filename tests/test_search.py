@@ -0,0 +1,28 @@
+from data import db_session, search
+from data.news import News
+from data.users import User
+
+
+def test_matches_outside_rank_window_are_reachable(app, make_user, monkeypatch):
+    author, _ = make_user()
+    stranger, _ = make_user()
+    db_sess = db_session.create_session()
+    # от старых к новым; последняя — чужая личная запись, она не должна занимать окно
+    posts = [News(title='zqwindow', content='-', user_id=author),
+             News(title='-', content='zqwindow', user_id=author),
+             News(title='zqwindow', content='-', user_id=author),
+             News(title='-', content='zqwindow', user_id=author),
+             News(title='zqwindow', content='-', user_id=stranger, is_private=True)]
+    db_sess.add_all(posts)
+    db_sess.commit()
+    ids = [post.id for post in posts]
+    user = db_sess.get(User, author)
+    monkeypatch.setattr(search, 'RANK_WINDOW', 2)
+
+    # два самых новых видимых совпадения — по рангу (заголовок выше), остальные — от новых к старым
+    rows, has_next = search.search_news(db_sess, user, 'zqwindow')
+    assert [news.id for news, snippet in rows] == [ids[2], ids[3], ids[1], ids[0]]
+    assert not has_next
+    rows, has_next = search.search_news(db_sess, user, 'zqwindow', page=2, limit=3)
+    assert [news.id for news, snippet in rows] == [ids[0]]
+    db_session.remove_session()
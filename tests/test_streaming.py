@@ -0,0 +1,14 @@
+import pytest
+
+from data import db_session
+
+
+@pytest.mark.parametrize('path, marker', [('/', '/news/'), ('/jobs', '<tr')])
+def test_streamed_page_renders_fully(client, login, path, marker):
+    login()
+    expected = client.get(path + '?stream=0').get_data(as_text=True)
+    body = client.get(path + '?stream=1').get_data(as_text=True)
+    assert body.rstrip().endswith('</html>')
+    assert body.count(marker) == expected.count(marker) > 0
+    # Сессия, открытая для потокового ответа, закрыта в teardown после его конца
+    assert db_session.stats() == {'sessions': 0, 'connections': 0}
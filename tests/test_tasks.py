@@ -0,0 +1,27 @@
+from data import tasks
+
+
+def test_inline_queue_runs_after_commit_without_breaking_the_request(client, login):
+    # Задачи из after_commit выполняются прямо в потоке запроса
+    assert isinstance(tasks._queue, tasks.InlineQueue)
+    login()
+    response = client.post('/news', data={'title': 'inline', 'content': 'c'})
+    assert response.status_code == 302
+    response = client.post('/addjob', data={'name': 'inline job', 'w_size': 3, 'collab': ['2'],
+                                            'hazard_level': ['1'], 'start_date': '2023-01-01 00:00:00',
+                                            'end_date': '2023-01-02 00:00:00'})
+    assert response.status_code == 302
+
+
+def test_failed_task_is_retried_with_backoff(monkeypatch):
+    monkeypatch.setattr(tasks, 'BACKOFF', 0)
+    calls = []
+
+    @tasks.task('test.flaky', retries=3)
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise RuntimeError('boom')
+
+    tasks.InlineQueue().put('test.flaky', ())
+    assert len(calls) == 3
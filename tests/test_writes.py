@@ -0,0 +1,128 @@
+import datetime
+
+import pytest
+import sqlalchemy as sa
+
+from data import db_session, queries, tasks, writes
+from data.category import LEVELS, category_ids
+from data.jobs import Jobs, job_collaborators
+from data.departments import Department, department_members
+from data.users import User, UserPrincipal
+
+# Каждая запись — фиксированное число запросов, сколько бы ни было связей;
+# чужая запись — один запрос (UPDATE/DELETE с проверкой владельца) и rollback.
+
+JOB = {'job': 'test job', 'work_size': 5, 'is_finished': False,
+       'start_date': datetime.datetime(2023, 1, 1), 'end_date': datetime.datetime(2023, 1, 2)}
+DEPARTMENT = {'title': 'test department', 'email': 'dep@test.org'}
+ADMIN = UserPrincipal(1, 'scott_chief@mars.org', 'Ridley', 'Scott')
+
+
+@pytest.fixture
+def db_sess(app, monkeypatch):
+    # Фоновые задачи после commit (слияние индекса поиска) в счёт записи не входят
+    monkeypatch.setattr(tasks, '_queue', tasks.ThreadQueue(workers=0))
+    db_sess = db_session.create_session()
+    category_ids(db_sess, LEVELS)  # уровни опасности кэшируются на процесс, прогреваем заранее
+    yield db_sess
+    db_session.remove_session()
+
+
+@pytest.fixture
+def users(make_user):
+    return [UserPrincipal(user_id, email, 'Test', 'Test') for user_id, email in (make_user(), make_user())]
+
+
+def _kinds(statements):
+    return [statement.split()[0] for statement in statements]
+
+
+def test_job_writes(db_sess, users, statements):
+    owner, other = users
+    statements.clear()
+    job_id = writes.create_job(db_sess, owner, JOB, [2, 3, 2], [1, 2])
+    assert _kinds(statements) == ['INSERT', 'INSERT', 'INSERT']
+
+    statements.clear()
+    assert writes.update_job(db_sess, job_id, other, JOB, [2], [1]) is False
+    assert _kinds(statements) == ['UPDATE']
+
+    for user in (owner, ADMIN):
+        statements.clear()
+        assert writes.update_job(db_sess, job_id, user, JOB, [3, 4], [2, 3]) == job_id
+        assert _kinds(statements) == ['UPDATE', 'DELETE', 'INSERT', 'DELETE', 'INSERT']
+
+    statements.clear()
+    assert writes.delete_job(db_sess, job_id, other) is False
+    assert _kinds(statements) == ['DELETE']
+
+    for user in (owner, ADMIN):
+        job_id = writes.create_job(db_sess, user, JOB, [2], [1])
+        statements.clear()
+        assert writes.delete_job(db_sess, job_id, user) == job_id
+        assert _kinds(statements) == ['DELETE', 'DELETE', 'DELETE']
+        assert db_sess.get(Jobs, job_id) is None
+
+
+def test_job_edit_touches_only_changed_links(db_sess, users):
+    owner = users[0]
+    job_id = writes.create_job(db_sess, owner, JOB, [2, 3], [1])
+    links = sa.select(job_collaborators.c.user_id, sa.literal_column('rowid')).where(
+        job_collaborators.c.job_id == job_id)
+    before = dict(db_sess.execute(links).all())
+    writes.update_job(db_sess, job_id, owner, JOB, [3, 4], [1])
+    after = dict(db_sess.execute(links).all())
+    assert set(after) == {3, 4}
+    # Оставшаяся связь не удалялась и не вставлялась заново
+    assert after[3] == before[3]
+
+
+def test_department_writes(db_sess, users, statements):
+    owner, other = users
+    statements.clear()
+    assert writes.chief_id(db_sess, owner.email) == owner.id
+    assert _kinds(statements) == ['SELECT']
+
+    statements.clear()
+    department_id = writes.create_department(db_sess, owner.id, DEPARTMENT, [2, 3])
+    assert _kinds(statements) == ['INSERT', 'INSERT']
+
+    statements.clear()
+    assert writes.update_department(db_sess, department_id, other, other.id, DEPARTMENT, [2]) is False
+    assert _kinds(statements) == ['UPDATE']
+
+    for user in (owner, ADMIN):
+        statements.clear()
+        assert writes.update_department(db_sess, department_id, user, owner.id, DEPARTMENT, [3, 4]) \
+            == department_id
+        assert _kinds(statements) == ['UPDATE', 'DELETE', 'INSERT']
+    members = db_sess.scalars(sa.select(department_members.c.user_id)
+                              .where(department_members.c.department_id == department_id)).all()
+    assert sorted(members) == [3, 4]
+
+    statements.clear()
+    assert writes.delete_department(db_sess, department_id, other) is False
+    assert _kinds(statements) == ['DELETE']
+
+    for user in (owner, ADMIN):
+        department_id = writes.create_department(db_sess, owner.id, DEPARTMENT, [2])
+        statements.clear()
+        assert writes.delete_department(db_sess, department_id, user) == department_id
+        assert _kinds(statements) == ['DELETE', 'DELETE']
+        assert db_sess.get(Department, department_id) is None
+
+
+def test_links_skip_missing_users_and_feed_membership_lookups(db_sess, users):
+    owner, member = users
+    missing = db_sess.scalar(sa.select(sa.func.max(User.id))) + 1000
+    job_id = writes.create_job(db_sess, owner, JOB, [member.id, missing], [1])
+    department_id = writes.create_department(db_sess, owner.id, DEPARTMENT, [member.id, missing])
+    assert db_sess.scalars(sa.select(job_collaborators.c.user_id)
+                           .where(job_collaborators.c.job_id == job_id)).all() == [member.id]
+    assert db_sess.scalars(sa.select(department_members.c.user_id)
+                           .where(department_members.c.department_id == department_id)).all() == [member.id]
+
+    assert [job.id for job in queries.jobs_of_user(db_sess, member.id)] == [job_id]
+    assert [department.id for department in queries.departments_of_user(db_sess, member.id)] == [department_id]
+    assert queries.jobs_of_user(db_sess, missing) == []
+    assert queries.departments_of_user(db_sess, owner.id) == []